@@ -0,0 +1,81 @@
+import os
+from collections import OrderedDict
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from broadcast import TokenBucket
+from metrics import CALLBACKS_REJECTED
+from render import message_key
+from update_processor import update_arrival_time
+
+# تکرار همان دکمه روی همان پیام در این بازه (ثانیه) نادیده گرفته می‌شود
+DEDUP_WINDOW = float(os.getenv('DEDUP_WINDOW', 2))
+
+# تعداد دکمه‌هایی که هر کاربر در ثانیه می‌تواند بزند و حداکثر تعداد پشت سر هم
+CALLBACK_RATE = float(os.getenv('CALLBACK_RATE', 3))
+CALLBACK_BURST = float(os.getenv('CALLBACK_BURST', 10))
+
+# حداکثر تعداد کاربران و پیام‌هایی که وضعیتشان نگه‌داری می‌شود
+ADMISSION_CACHE_SIZE = int(os.getenv('ADMISSION_CACHE_SIZE', 10000))
+
+
+# پذیرش callback queryها پیش از رسیدن به هندلرها:
+# - زدن دوباره همان دکمه روی همان پیام (مثلاً دو بار زدن دکمه دسر) تا DEDUP_WINDOW ثانیه رد می‌شود؛
+#   فقط آخرین دکمه پذیرفته شده هر پیام مقایسه می‌شود تا رفت و برگشت بین صفحه‌ها (مثلاً دکمه بازگشت) رد نشود.
+#   زمان‌ها زمان رسیدن آپدیت هستند، نه زمان اجرای هندلر؛ آپدیت‌های یک کاربر پشت هم اجرا می‌شوند
+#   و ضربه دوم ممکن است تا پایان یک هندلر کند (مثل خروجی اکسل) منتظر مانده باشد.
+# - برای هر کاربر یک token bucket جدا نگه‌داری می‌شود؛ ضربه‌های تکراری توکن مصرف نمی‌کنند
+class Admission:
+    def __init__(self, window: float = DEDUP_WINDOW, rate: float = CALLBACK_RATE,
+                 burst: float = CALLBACK_BURST, max_size: int = ADMISSION_CACHE_SIZE):
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.max_size = max_size
+        # (user_id, پیام) -> (callback_data, زمان رسیدن)
+        self._last = OrderedDict()
+        self._buckets = OrderedDict()
+
+    @staticmethod
+    def _remember(entries: OrderedDict, key, value, max_size: int):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > max_size:
+            entries.popitem(last=False)
+
+    def is_duplicate(self, user_id: int, message, data: str, arrived_at: float) -> bool:
+        last = self._last.get((user_id, message))
+        return last is not None and last[0] == data and arrived_at - last[1] < self.window
+
+    # ثبت ضربه پذیرفته شده
+    def admit(self, user_id: int, message, data: str, arrived_at: float):
+        self._remember(self._last, (user_id, message), (data, arrived_at), self.max_size)
+
+    def allow(self, user_id: int) -> bool:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+        self._remember(self._buckets, user_id, bucket, self.max_size)
+        return bucket.try_acquire()
+
+
+admission = Admission()
+
+
+# هندلر گروه -1؛ callback رد شده فقط پاسخ داده می‌شود و به هیچ هندلر دیگری نمی‌رسد
+async def admit_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user_id = update.effective_user.id
+    message = message_key(query)
+    arrived_at = update_arrival_time()
+
+    if admission.is_duplicate(user_id, message, query.data, arrived_at):
+        CALLBACKS_REJECTED.inc(reason='duplicate')
+        await query.answer()
+        raise ApplicationHandlerStop
+
+    if not admission.allow(user_id):
+        CALLBACKS_REJECTED.inc(reason='rate_limited')
+        await query.answer("⏳ لطفاً کمی آهسته‌تر!")
+        raise ApplicationHandlerStop
+
+    admission.admit(user_id, message, query.data, arrived_at)
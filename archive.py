@@ -0,0 +1,68 @@
+import os
+import asyncio
+import logging
+import sqlite3
+from datetime import timedelta
+from telegram.ext import ContextTypes
+from tenants import tenant_manager
+from booking_calendar import booking_calendar
+
+logger = logging.getLogger(__name__)
+
+# رزروهایی که این تعداد روز از تاریخشان گذشته به جدول آرشیو منتقل می‌شوند؛
+# تاریخچه از view reservations_history (شامل آرشیو) خوانده می‌شود، پس چند روز کافی است
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 3))
+
+# تعداد رزروهای منتقل شده در هر تراکنش
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+
+# فاصله اجرای کار آرشیو (ثانیه)
+ARCHIVE_INTERVAL = int(os.getenv('ARCHIVE_INTERVAL', 24 * 60 * 60))
+
+
+# انتقال یک دسته از قدیمی‌ترین رزروها به آرشیو (در ترد دیتابیس و در یک تراکنش اجرا می‌شود)
+def archive_batch(conn: sqlite3.Connection, cutoff: str, batch_size: int) -> int:
+    ids = [
+        (reservation_id,) for (reservation_id,) in conn.execute(
+            "SELECT id FROM reservations WHERE reservation_date < ? ORDER BY reservation_date LIMIT ?",
+            (cutoff, batch_size)
+        )
+    ]
+    conn.executemany(
+        '''INSERT INTO reservations_archive (id, user_id, meal_id, dessert_id, reservation_date, created_at)
+           SELECT id, user_id, meal_id, dessert_id, reservation_date, created_at
+           FROM reservations WHERE id = ?''',
+        ids
+    )
+    conn.executemany("DELETE FROM reservations WHERE id = ?", ids)
+    # شمارش روزهای آرشیو شده دیگر لازم نیست؛ در صورت نیاز از آرشیو محاسبه می‌شود
+    conn.execute("DELETE FROM daily_meal_counts WHERE reservation_date < ?", (cutoff,))
+    return len(ids)
+
+
+# انتقال دسته‌ای رزروهای قدیمی یک دیتابیس؛ هر دسته تراکنش جداگانه‌ای دارد
+# تا نوشتن رزروهای جدید پشت آن منتظر نماند
+async def archive_database(db, cutoff: str) -> int:
+    total = 0
+
+    while True:
+        moved = await db.run(archive_batch, cutoff, ARCHIVE_BATCH_SIZE)
+        total += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            return total
+        await asyncio.sleep(0)
+
+
+# کار زمان‌بندی شده JobQueue: آرشیو رزروهای قدیمی همه سلف‌ها تا جدول اصلی فقط بازه فعال را نگه دارد
+async def archive_reservations(context: ContextTypes.DEFAULT_TYPE):
+    cutoff = (booking_calendar.today.date - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+
+    for name in tenant_manager.configs:
+        try:
+            async with tenant_manager.use(name) as tenant:
+                total = await archive_database(tenant.db, cutoff)
+        except Exception as e:
+            logger.error(f"Archiving tenant {name} failed: {e}")
+            continue
+        if total:
+            logger.info(f"Archived {total} reservations of {name} older than {cutoff}")
@@ -0,0 +1,445 @@
+import os
+import sys
+import json
+import time
+import signal
+import random
+import asyncio
+import logging
+import argparse
+import itertools
+import tempfile
+import subprocess
+from urllib.parse import parse_qsl
+import httpx
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+# بنچمارک درون‌پروسسی هندلرهای ربات
+# هندلرهای واقعی meal_bot.py با Updateهای ساختگی و یک Bot جایگزین (بدون اتصال به تلگرام)
+# روی یک دیتابیس SQLite آزمایشی اجرا می‌شوند و تأخیر p50/p99 و توان عملیاتی هر هندلر گزارش می‌شود.
+#
+# با --webhook-workers N حالت webhook چند پروسسی به صورت محلی اجرا می‌شود: یک سرور HTTP جایگزین
+# Bot API بالا می‌آید، meal_bot.py به عنوان پروسس جلویی با N worker به آن وصل می‌شود و Updateهای
+# جریان رزرو کاربران به webhook فرستاده می‌شوند تا همه پاسخ داده شوند.
+#
+# مثال:
+#   python benchmark.py --users 500 --iterations 300 --concurrency 8
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark meal_bot handlers with synthetic updates")
+    parser.add_argument('--users', type=int, default=200, help="number of seeded users")
+    parser.add_argument('--meals-per-day', type=int, default=3)
+    parser.add_argument('--desserts-per-day', type=int, default=2)
+    parser.add_argument('--reservations', type=int, default=5, help="seeded reservations per user")
+    parser.add_argument('--iterations', type=int, default=200, help="number of user reservation flows")
+    parser.add_argument('--admin-iterations', type=int, default=5, help="number of admin flows")
+    parser.add_argument('--broadcasts', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=1, help="flows running at the same time")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="simulated Bot API latency (ms)")
+    parser.add_argument('--db', help="database file to seed; its contents are replaced (default: a temporary file)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--webhook-workers', type=int, default=0,
+                        help="run meal_bot.py in multi-process webhook mode with this many workers")
+    parser.add_argument('--webhook-port', type=int, default=18443, help="webhook port of the front process")
+    parser.add_argument('--api-port', type=int, default=18081, help="port of the stand-in Bot API server")
+    return parser.parse_args()
+
+
+args = parse_args()
+random.seed(args.seed)
+
+_tmpdir = None
+if args.db is None:
+    _tmpdir = tempfile.TemporaryDirectory()
+    args.db = os.path.join(_tmpdir.name, 'bench.db')
+os.environ['DATABASE_PATH'] = args.db
+# Bot جایگزین محدودیت نرخ تلگرام را ندارد
+os.environ.setdefault('BROADCAST_RATE', '100000')
+# هر کاربر ساختگی بسیار سریع‌تر از یک انسان دکمه می‌زند
+os.environ.setdefault('CALLBACK_RATE', '100000')
+
+from database import Database  # noqa: E402
+from migrations import migrate  # noqa: E402
+from booking_calendar import booking_calendar, persian_weekday  # noqa: E402
+
+# شناسه کاربران آزمایشی از این عدد شروع می‌شود
+USER_BASE = 10_000_000
+
+
+def seed_database(path: str):
+    conn = Database(path).connect()
+    migrate(conn)
+    today = booking_calendar.today.date
+
+    with conn:
+        conn.execute("DELETE FROM reservations")
+        conn.execute("DELETE FROM meals")
+        conn.execute("DELETE FROM users")
+
+        conn.executemany(
+            "INSERT INTO users (user_id, first_name, last_name) VALUES (?, ?, ?)",
+            ((USER_BASE + i, f"کاربر{i}", f"آزمایشی{i}") for i in range(args.users))
+        )
+
+        menu = defaultdict(list)
+        for day in range(7):
+            for meal_type, count in (('meal', args.meals_per_day), ('dessert', args.desserts_per_day)):
+                for j in range(count):
+                    cursor = conn.execute(
+                        "INSERT INTO meals (name, type, day_of_week) VALUES (?, ?, ?)",
+                        (f"{meal_type} {day}-{j}", meal_type, day)
+                    )
+                    menu[(day, meal_type)].append(cursor.lastrowid)
+
+        rows = []
+        for i in range(args.users):
+            for offset in random.sample(range(14), min(args.reservations, 14)):
+                date = today + timedelta(days=offset)
+                meals = menu[(persian_weekday(date), 'meal')]
+                desserts = menu[(persian_weekday(date), 'dessert')]
+                if meals:
+                    rows.append((
+                        USER_BASE + i,
+                        random.choice(meals),
+                        random.choice(desserts) if desserts else None,
+                        date.isoformat()
+                    ))
+        conn.executemany(
+            "INSERT INTO reservations (user_id, meal_id, dessert_id, reservation_date) VALUES (?, ?, ?, ?)",
+            rows
+        )
+
+    conn.close()
+    return menu
+
+
+MENU = seed_database(args.db)
+
+from telegram import Update  # noqa: E402
+from telegram.ext import Application, ExtBot  # noqa: E402
+import meal_bot  # noqa: E402
+from tenants import ADMIN_ID, tenant_manager  # noqa: E402
+from keyboards import reserve_day_data, reserve_meal_data, reserve_dessert_data  # noqa: E402
+from webhook_workers import serve_requests  # noqa: E402
+
+logging.getLogger().setLevel(logging.WARNING)
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+
+# پاسخ ساختگی یک متد Bot API
+def fake_result(endpoint: str, data: dict, message_ids):
+    if endpoint == 'getMe':
+        return BOT_USER
+    if endpoint in ('sendMessage', 'sendDocument', 'editMessageText'):
+        message = {
+            'message_id': int(data.get('message_id') or next(message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': int(data.get('chat_id', 0)), 'type': 'private'},
+            'text': data.get('text', ''),
+        }
+        if endpoint == 'sendDocument':
+            message['document'] = {'file_id': 'BENCH_DOCUMENT', 'file_unique_id': 'BENCH_DOCUMENT'}
+        return message
+    return True
+
+
+# Bot جایگزین که به جای ارسال درخواست به تلگرام، فراخوانی‌ها را ثبت کرده و پاسخ ساختگی برمی‌گرداند
+class RecordingBot(ExtBot):
+    def __init__(self, *bot_args, latency: float = 0.0, **kwargs):
+        super().__init__(*bot_args, **kwargs)
+        with self._unfrozen():
+            self.calls = Counter()
+            self.latency = latency
+            self._message_ids = itertools.count(1)
+
+    async def _do_post(self, endpoint, data, **kwargs):
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return fake_result(endpoint, data, self._message_ids)
+
+
+# سرور HTTP جایگزین Bot API برای پروسس‌های جداگانه (حالت --webhook-workers)
+class FakeBotApi:
+    def __init__(self, latency: float = 0.0):
+        self.calls = Counter()
+        self.latency = latency
+        self._message_ids = itertools.count(1)
+        self.server = None
+
+    async def _handle(self, method: str, path: str, headers: dict, body: bytes):
+        endpoint = path.rsplit('/', 1)[-1]
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        # فایل‌ها multipart فرستاده می‌شوند؛ پارامترهای آن‌ها برای پاسخ ساختگی لازم نیست
+        data = {}
+        if headers.get('content-type', '').startswith('application/x-www-form-urlencoded'):
+            data = dict(parse_qsl(body.decode()))
+        elif headers.get('content-type', '').startswith('application/json'):
+            data = json.loads(body or b'{}')
+        result = fake_result(endpoint, data, self._message_ids)
+        return '200 OK', json.dumps({'ok': True, 'result': result}).encode()
+
+    async def start(self, port: int):
+        self.server = await asyncio.start_server(
+            lambda reader, writer: serve_requests(reader, writer, self._handle), '127.0.0.1', port
+        )
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class Bench:
+    def __init__(self, application: Application):
+        self.application = application
+        self.bot = application.bot if application is not None else ExtBot('0:benchmark')
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self._update_ids = itertools.count(1)
+        self.dates = [day.date for day in booking_calendar.days]
+
+    def _user(self, user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': 'Bench'}
+
+    def _chat(self, user_id: int) -> dict:
+        return {'id': user_id, 'type': 'private'}
+
+    def message(self, user_id: int, text: str) -> Update:
+        update_id = next(self._update_ids)
+        message = {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': self._chat(user_id),
+            'from': self._user(user_id),
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return Update.de_json({'update_id': update_id, 'message': message}, self.bot)
+
+    def callback(self, user_id: int, data: str) -> Update:
+        update_id = next(self._update_ids)
+        return Update.de_json({
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': {
+                    'message_id': update_id,
+                    'date': int(time.time()),
+                    'chat': self._chat(user_id),
+                    'text': 'menu',
+                },
+            },
+        }, self.bot)
+
+    async def run(self, label: str, update: Update):
+        start = time.perf_counter()
+        # از مسیر update processor تا سلف کاربر مثل اجرای واقعی باز شود
+        await self.application.update_processor.process_update(
+            update, self.application.process_update(update)
+        )
+        self.latencies[label].append(time.perf_counter() - start)
+
+    # جریان کامل رزرو یک کاربر
+    async def user_flow(self):
+        user_id = USER_BASE + random.randrange(args.users)
+        await self.run('start', self.message(user_id, '/start'))
+        await self.run('reserve_food', self.callback(user_id, 'reserve_food'))
+
+        date = random.choice(self.dates)
+        await self.run('rd:*', self.callback(user_id, reserve_day_data(date)))
+
+        meals = MENU[(persian_weekday(date), 'meal')]
+        if meals:
+            meal = random.choice(meals)
+            await self.run('rm:*', self.callback(user_id, reserve_meal_data(date, meal)))
+            desserts = MENU[(persian_weekday(date), 'dessert')]
+            dessert = random.choice(desserts) if desserts else None
+            await self.run('rs:* (complete_reservation)', self.callback(user_id, reserve_dessert_data(date, meal, dessert)))
+
+        await self.run('my_reservations', self.callback(user_id, 'my_reservations'))
+
+    # جریان صفحات ادمین
+    async def admin_flow(self):
+        admin_id = ADMIN_ID
+        await self.run('start (admin)', self.message(admin_id, '/start'))
+        await self.run('admin_view_reservations', self.callback(admin_id, 'admin_view_reservations'))
+        await self.run('list_users', self.callback(admin_id, 'list_users'))
+        await self.run('list_meals', self.callback(admin_id, 'list_meals'))
+        await self.run('admin_export_excel', self.callback(admin_id, 'admin_export_excel'))
+        await self.run('kitchen_summary', self.callback(admin_id, 'kitchen_summary'))
+        await self.run('kitchen_summary_excel', self.callback(admin_id, 'kitchen_summary_excel'))
+        await self.run('reservation_history', self.callback(admin_id, 'reservation_history'))
+
+    async def broadcast_flow(self):
+        admin_id = ADMIN_ID
+        await self.run('admin_broadcast', self.callback(admin_id, 'admin_broadcast'))
+        await self.run('send_broadcast', self.message(admin_id, 'benchmark broadcast'))
+
+    async def run_flows(self, flow, count: int):
+        remaining = iter(range(count))
+
+        async def worker():
+            for _ in remaining:
+                await flow()
+
+        await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def report(bench: Bench, wall: float, databases: list):
+    print(f"\n{'handler':<36}{'calls':>7}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>10}")
+    total = 0
+    for label, values in bench.latencies.items():
+        total += len(values)
+        print(
+            f"{label:<36}{len(values):>7}"
+            f"{percentile(values, 0.5) * 1000:>10.2f}"
+            f"{percentile(values, 0.99) * 1000:>10.2f}"
+            f"{max(values) * 1000:>10.2f}"
+            f"{len(values) / sum(values):>10.1f}"
+        )
+    print(f"\n{total} updates in {wall:.2f}s ({total / wall:.1f} updates/s, concurrency {args.concurrency})")
+
+    if bench.errors:
+        print("\nhandler errors:")
+        for error, count in bench.errors.most_common():
+            print(f"  {count:>5}  {error}")
+
+    print("\nBot API calls:")
+    for endpoint, count in bench.bot.calls.most_common():
+        print(f"  {count:>7}  {endpoint}")
+
+    print("\nslowest queries (total time):")
+    merged = {}
+    for database in databases:
+        for sql, (count, elapsed, worst) in database.query_stats.items():
+            stats = merged.setdefault(sql, [0, 0.0, 0.0])
+            stats[0] += count
+            stats[1] += elapsed
+            stats[2] = max(stats[2], worst)
+    stats = sorted(merged.items(), key=lambda item: item[1][1], reverse=True)
+    for sql, (count, elapsed, worst) in stats[:10]:
+        sql = " ".join(sql.split())
+        print(f"  {count:>7} calls {elapsed * 1000:>9.1f} ms total {worst * 1000:>8.2f} ms max  {sql[:70]}")
+
+
+# جمع‌آوری Updateهای جریان‌ها به جای اجرای آن‌ها (برای فرستادن به webhook)
+class UpdateCollector(Bench):
+    def __init__(self):
+        super().__init__(None)
+        self.updates = []
+
+    async def run(self, label: str, update: Update):
+        self.updates.append(update)
+
+
+# اجرای meal_bot.py در حالت webhook چند پروسسی در برابر FakeBotApi
+async def webhook_main():
+    token = '0:benchmark'
+    api = FakeBotApi(latency=args.api_latency / 1000)
+    await api.start(args.api_port)
+
+    collector = UpdateCollector()
+    for _ in range(args.iterations):
+        await collector.user_flow()
+    callbacks = sum(1 for update in collector.updates if update.callback_query)
+    messages = len(collector.updates) - callbacks
+
+    secret = 'benchmark-secret'
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN=token,
+        WEBHOOK_SECRET=secret,
+        TELEGRAM_API_URL=f"http://127.0.0.1:{args.api_port}",
+        WEBHOOK_WORKERS=str(args.webhook_workers),
+        WEBHOOK_URL=f"http://127.0.0.1:{args.webhook_port}",
+        PORT=str(args.webhook_port),
+    )
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'meal_bot.py')
+    front = subprocess.Popen([sys.executable, script], env=env)
+
+    try:
+        # پروسس جلویی و هر worker هنگام شروع یک بار getMe را صدا می‌زنند
+        deadline = time.monotonic() + 60
+        while api.calls['setWebhook'] < 1 or api.calls['getMe'] < args.webhook_workers + 1:
+            if time.monotonic() > deadline or front.poll() is not None:
+                raise RuntimeError("webhook front or workers did not start")
+            await asyncio.sleep(0.1)
+
+        start = time.perf_counter()
+        async with httpx.AsyncClient(timeout=30) as client:
+            for update in collector.updates:
+                response = await client.post(
+                    f"http://127.0.0.1:{args.webhook_port}/{token}", content=update.to_json().encode(),
+                    headers={'X-Telegram-Bot-Api-Secret-Token': secret}
+                )
+                response.raise_for_status()
+
+        # هر callback یک answerCallbackQuery و هر /start یک sendMessage دارد
+        deadline = time.monotonic() + 120
+        while api.calls['answerCallbackQuery'] < callbacks or api.calls['sendMessage'] < messages:
+            if time.monotonic() > deadline:
+                raise RuntimeError("not all updates were answered")
+            await asyncio.sleep(0.01)
+        wall = time.perf_counter() - start
+    finally:
+        front.send_signal(signal.SIGTERM)
+        await asyncio.get_running_loop().run_in_executor(None, front.wait)
+        await api.stop()
+
+    total = len(collector.updates)
+    print(f"\n{total} updates in {wall:.2f}s ({total / wall:.1f} updates/s, {args.webhook_workers} webhook workers)")
+    print("\nBot API calls:")
+    for endpoint, count in api.calls.most_common():
+        print(f"  {count:>7}  {endpoint}")
+
+
+async def main():
+    bot = RecordingBot('0:benchmark', latency=args.api_latency / 1000)
+    application = meal_bot.build_application(Application.builder().bot(bot).updater(None))
+    bench = Bench(application)
+
+    async def on_error(update, context):
+        bench.errors[repr(context.error)] += 1
+
+    application.add_error_handler(on_error)
+
+    await application.initialize()
+    await meal_bot.post_init(application)
+    await application.start()
+
+    start = time.perf_counter()
+    await bench.run_flows(bench.user_flow, args.iterations)
+    await bench.run_flows(bench.admin_flow, args.admin_iterations)
+    for _ in range(args.broadcasts):
+        await bench.broadcast_flow()
+    wall = time.perf_counter() - start
+
+    # کارهای پس‌زمینه (مثل ارسال پیام همگانی) جزو زمان هندلرها نیستند و در stop منتظرشان می‌مانیم
+    await application.stop()
+    databases = [meal_bot.db] + [tenant.db for tenant in tenant_manager.open_tenants()]
+    await application.shutdown()
+    await meal_bot.shutdown(application)
+    report(bench, wall, databases)
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(webhook_main() if args.webhook_workers else main())
+    finally:
+        if _tmpdir is not None:
+            _tmpdir.cleanup()
+        sys.stdout.flush()
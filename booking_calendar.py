@@ -0,0 +1,105 @@
+import os
+import logging
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from telegram.ext import ContextTypes
+from keyboards import WEEKDAYS, RESERVATION_DAYS, KITCHEN_SUMMARY_DAYS, HISTORY_DAYS
+
+logger = logging.getLogger(__name__)
+
+# منطقه زمانی سلف؛ «امروز» و شروع هر روز بر اساس آن محاسبه می‌شود
+CANTEEN_TZ = os.getenv('CANTEEN_TZ', 'Asia/Tehran')
+
+# نمایش تاریخ‌ها به شمسی به جای میلادی
+JALALI_DATES = os.getenv('JALALI_DATES') == '1'
+
+
+# شماره روز هفته در WEEKDAYS و جدول meals (شنبه = 0)؛ date.weekday() دوشنبه را 0 می‌گیرد
+def persian_weekday(day: date) -> int:
+    return (day.weekday() + 2) % 7
+
+
+# تبدیل تاریخ میلادی به شمسی -> (سال، ماه، روز)
+def to_jalali(day: date) -> tuple:
+    days_before_month = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+    gy = day.year + 1 if day.month > 2 else day.year
+    days = (355666 + 365 * day.year + (gy + 3) // 4 - (gy + 99) // 100 + (gy + 399) // 400
+            + day.day + days_before_month[day.month - 1])
+    jy = -1595 + 33 * (days // 12053)
+    days %= 12053
+    jy += 4 * (days // 1461)
+    days %= 1461
+    if days > 365:
+        jy += (days - 1) // 365
+        days = (days - 1) % 365
+    if days < 186:
+        return jy, 1 + days // 31, 1 + days % 31
+    return jy, 7 + (days - 186) // 30, 1 + (days - 186) % 30
+
+
+class Day:
+    __slots__ = ('date', 'iso', 'ordinal', 'weekday', 'name', 'jalali', 'short', 'full', 'label', 'full_label')
+
+    def __init__(self, value: date):
+        self.date = value
+        self.iso = value.isoformat()
+        self.ordinal = value.toordinal()
+        self.weekday = persian_weekday(value)
+        self.name = WEEKDAYS[self.weekday]
+        self.jalali = to_jalali(value)
+        if JALALI_DATES:
+            year, month, day = self.jalali
+        else:
+            year, month, day = value.year, value.month, value.day
+        self.short = f"{day:02d}/{month:02d}"
+        self.full = f"{self.short}/{year}"
+        self.label = f"{self.name} {self.short}"
+        self.full_label = f"{self.name} {self.full}"
+
+
+# اطلاعات نمایشی یک تاریخ ISO؛ هر تاریخ فقط یک بار ساخته می‌شود
+@lru_cache(maxsize=1024)
+def day_info(date_str: str) -> Day:
+    return Day(date.fromisoformat(date_str))
+
+
+# بازه رزرو فعال که روزی یک بار (نیمه‌شب به وقت سلف) محاسبه می‌شود؛
+# هندلرها و فیلترهای تاریخ کوئری‌ها به جای date('now') (که UTC است) از آن استفاده می‌کنند
+class BookingCalendar:
+    def __init__(self, tz: str = CANTEEN_TZ):
+        self.tz = ZoneInfo(tz)
+        self.refresh()
+
+    def refresh(self):
+        today = datetime.now(self.tz).date()
+        days = tuple(day_info((today + timedelta(days=i)).isoformat()) for i in range(RESERVATION_DAYS))
+
+        self.today = days[0]
+        self.days = days
+        self._by_ordinal = {day.ordinal: day for day in days}
+        # ستون‌های فایل‌های اکسل دو هفته آینده
+        self.dates = [day.iso for day in days]
+        self.export_headers = [f"{day.name}\n{day.short}" for day in days]
+        # بازه خلاصه آشپزخانه و تاریخچه (هر دو شامل دو سر بازه)
+        self.summary_end = (today + timedelta(days=KITCHEN_SUMMARY_DAYS - 1)).isoformat()
+        self.history_start = (today - timedelta(days=HISTORY_DAYS)).isoformat()
+        self.yesterday = (today - timedelta(days=1)).isoformat()
+
+    # روز قابل رزرو مربوط به تاریخ، یا None اگر خارج از بازه باشد
+    def day(self, value: date):
+        return self._by_ordinal.get(value.toordinal())
+
+    # زمان اجرای روزانه refresh_calendar
+    @property
+    def midnight(self) -> time:
+        return time(0, 0, tzinfo=self.tz)
+
+
+booking_calendar = BookingCalendar()
+
+
+# کار روزانه JobQueue
+async def refresh_calendar(context: ContextTypes.DEFAULT_TYPE):
+    booking_calendar.refresh()
+    logger.info(f"Booking window starts {booking_calendar.today.iso}")
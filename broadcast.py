@@ -0,0 +1,135 @@
+import os
+import time
+import asyncio
+import logging
+from telegram import Message
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# سرعت ارسال (پیام در ثانیه)؛ کمی پایین‌تر از محدودیت ۳۰ پیام در ثانیه تلگرام
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 25))
+
+# حداکثر تعداد ارسال هم‌زمان
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 8))
+
+# تعداد تلاش مجدد برای خطاهای موقت شبکه
+BROADCAST_RETRIES = 3
+
+# فاصله به‌روزرسانی پیام وضعیت (ثانیه)
+PROGRESS_INTERVAL = 2.0
+
+
+# محدودکننده نرخ به روش token bucket
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    # گرفتن یک توکن بدون انتظار؛ اگر توکنی نباشد False برمی‌گردد
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    # توقف کامل ارسال به مدت مشخص (مثلاً پس از خطای RetryAfter)
+    def pause(self, seconds: float):
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+# ارسال پیام همگانی در پس‌زمینه با گزارش پیشرفت در یک پیام ادمین
+# texts (اختیاری): متن جداگانه هر کاربر (user_id -> متن) به جای text
+class Broadcast:
+    def __init__(self, bot, user_ids: list, text: str, progress_message: Message, texts: dict = None):
+        self.bot = bot
+        self.user_ids = user_ids
+        self.text = text
+        self.texts = texts
+        self.progress_message = progress_message
+        self.sent = 0
+        self.failed = 0
+        self._limiter = TokenBucket(BROADCAST_RATE)
+        self._semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+    async def run(self):
+        reporter = asyncio.create_task(self._report_progress())
+        try:
+            await asyncio.gather(*(self._deliver(user_id) for user_id in self.user_ids))
+        finally:
+            reporter.cancel()
+            await self._edit_progress(
+                f"✅ پیام شما به {self.sent} کاربر ارسال شد.\n"
+                f"❌ {self.failed} کاربر دریافت نکردند.\n\n"
+                "برای بازگشت به منو /start را ارسال کنید."
+            )
+
+    async def _deliver(self, user_id: int):
+        async with self._semaphore:
+            if await self._send(user_id):
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    async def _send(self, user_id: int) -> bool:
+        attempt = 0
+        while True:
+            await self._limiter.acquire()
+            try:
+                text = self.texts[user_id] if self.texts else self.text
+                await self.bot.send_message(chat_id=user_id, text=text)
+                return True
+            except RetryAfter as e:
+                logger.warning(f"Flood limit hit, pausing broadcast for {e.retry_after}s")
+                self._limiter.pause(e.retry_after)
+                continue
+            except (BadRequest, Forbidden) as e:
+                logger.error(f"Failed to send to {user_id}: {e}")
+                return False
+            except NetworkError as e:
+                if attempt >= BROADCAST_RETRIES:
+                    logger.error(f"Failed to send to {user_id}: {e}")
+                    return False
+                attempt += 1
+                await asyncio.sleep(2 ** attempt)
+            except TelegramError as e:
+                logger.error(f"Failed to send to {user_id}: {e}")
+                return False
+
+    async def _report_progress(self):
+        last = None
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            current = (self.sent, self.failed)
+            if current != last:
+                last = current
+                await self._edit_progress(
+                    "📢 در حال ارسال پیام همگانی...\n\n"
+                    f"✅ ارسال شده: {self.sent} از {len(self.user_ids)}\n"
+                    f"❌ ناموفق: {self.failed}"
+                )
+
+    async def _edit_progress(self, text: str):
+        try:
+            await self.progress_message.edit_text(text)
+        except TelegramError as e:
+            logger.warning(f"Failed to update broadcast progress: {e}")
@@ -0,0 +1,224 @@
+import os
+import mmap
+import time
+import struct
+from collections import OrderedDict
+from metrics import CACHE_REQUESTS
+
+# حداکثر تعداد کاربران نگه‌داری شده در کش دسترسی
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', 10000))
+
+# مدت اعتبار هر رکورد کش دسترسی (ثانیه)
+AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', 600))
+
+# وقتی چند پروسس از یک دیتابیس استفاده می‌کنند (حالت چند worker)، شماره نسخه داده‌ها
+# در یک فایل mmap کنار دیتابیس نگه‌داری می‌شود تا کش همه پروسس‌ها با هم باطل شود
+SHARED_DATA_VERSION = os.getenv('SHARED_DATA_VERSION') == '1'
+
+
+# کش وضعیت دسترسی کاربران (user_id -> فعال بودن)
+# با اندازه محدود (LRU) و زمان انقضا؛ پس از هر تغییر در جدول users باید invalidate شود
+class AuthCache:
+    def __init__(self, max_size: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] < time.monotonic():
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache='auth', result='miss')
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        CACHE_REQUESTS.inc(cache='auth', result='hit')
+        return entry[0]
+
+    def set(self, user_id: int, authorized: bool):
+        self._entries[user_id] = (authorized, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    # حذف یک کاربر از کش، یا کل کش اگر user_id داده نشود
+    def invalidate(self, user_id: int = None):
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    # بارگذاری اولیه کش از جدول کاربران
+    async def load(self, db):
+        rows = await db.fetchall(
+            "SELECT user_id, is_active FROM users ORDER BY created_at DESC LIMIT ?",
+            (self.max_size,)
+        )
+        self._entries.clear()
+        for user_id, is_active in reversed(rows):
+            self.set(user_id, is_active == 1)
+
+
+# کش منوی هفتگی: (day_of_week, type) -> [(id, name), ...]
+# با یک کوئری ساخته می‌شود و فقط پس از تغییر جدول meals دوباره بارگذاری می‌شود.
+# غذاهای retired در منو نیستند ولی نامشان برای رزروهای موجود در دسترس است؛
+# در متریک‌ها هر بارگذاری دوباره یک miss و هر خواندن از کش یک hit شمرده می‌شود
+class MenuCache:
+    def __init__(self):
+        self._by_day = {}
+        self._names = {}
+
+    async def refresh(self, db):
+        CACHE_REQUESTS.inc(cache='menu', result='miss')
+        rows = await db.fetchall("SELECT id, name, type, day_of_week, retired FROM meals ORDER BY id")
+        by_day = {}
+        names = {}
+        for meal_id, name, meal_type, day_of_week, retired in rows:
+            if not retired:
+                by_day.setdefault((day_of_week, meal_type), []).append((meal_id, name))
+            names[meal_id] = name
+        self._by_day = by_day
+        self._names = names
+
+    def items(self, day_of_week: int, meal_type: str) -> list:
+        CACHE_REQUESTS.inc(cache='menu', result='hit')
+        return self._by_day.get((day_of_week, meal_type), [])
+
+    def name(self, meal_id: int):
+        CACHE_REQUESTS.inc(cache='menu', result='hit')
+        return self._names.get(meal_id)
+
+
+# شماره نسخه داده‌ها؛ پس از هر نوشتن در جدول‌های users، meals و reservations افزایش می‌یابد
+# کش‌هایی که از چند جدول ساخته می‌شوند با مقایسه این شماره اعتبار خود را می‌سنجند.
+# شمارنده‌های users و meals فقط با تغییر همان جدول افزایش می‌یابند.
+# شمارنده users به ازای هر کاربر تغییر کرده یک واحد جلو می‌رود و شناسه کاربر در یک حلقه
+# USER_LOG_SIZE خانه‌ای ثبت می‌شود تا هر پروسس فقط همان کاربران را از کش خود حذف کند.
+class DataVersion:
+    # ترتیب شمارنده‌ها؛ پس از آن‌ها حلقه شناسه کاربران تغییر کرده می‌آید
+    DATA, USERS, MEALS = range(3)
+    USER_LOG_SIZE = 64
+    SLOTS = 3 + USER_LOG_SIZE
+    # نشانه تغییر همه کاربران (مثلاً بارگذاری فایلی بزرگ‌تر از حلقه)
+    ALL_USERS = 0
+
+    def __init__(self):
+        self._slots = [0] * self.SLOTS
+
+    def _get(self, index: int) -> int:
+        return self._slots[index]
+
+    def _set(self, index: int, value: int):
+        self._slots[index] = value
+
+    def _lock(self):
+        pass
+
+    def _unlock(self):
+        pass
+
+    @property
+    def value(self) -> int:
+        return self._get(self.DATA)
+
+    @property
+    def users(self) -> int:
+        return self._get(self.USERS)
+
+    @property
+    def meals(self) -> int:
+        return self._get(self.MEALS)
+
+    # user_ids: کاربرانی که تغییر کرده‌اند؛ اگر داده نشود همه کاربران تغییر کرده حساب می‌شوند
+    def bump(self, users: bool = False, meals: bool = False, user_ids=None):
+        self._lock()
+        try:
+            self._set(self.DATA, self._get(self.DATA) + 1)
+            if users:
+                changed = list(user_ids) if user_ids is not None else [self.ALL_USERS]
+                if len(changed) > self.USER_LOG_SIZE:
+                    changed = [self.ALL_USERS]
+                version = self._get(self.USERS)
+                for user_id in changed:
+                    version += 1
+                    self._set(3 + version % self.USER_LOG_SIZE, user_id)
+                self._set(self.USERS, version)
+            if meals:
+                self._set(self.MEALS, self._get(self.MEALS) + 1)
+        finally:
+            self._unlock()
+
+    # کاربرانی که بین دو نسخه users تغییر کرده‌اند؛ None یعنی همه کش باید دوباره بارگذاری شود
+    def changed_users(self, since: int, until: int):
+        if until - since > self.USER_LOG_SIZE:
+            return None
+        user_ids = {self._get(3 + version % self.USER_LOG_SIZE) for version in range(since + 1, until + 1)}
+        # حلقه ممکن است هم‌زمان با خواندن بازنویسی شده باشد
+        if self.users - since > self.USER_LOG_SIZE or self.ALL_USERS in user_ids:
+            return None
+        return user_ids
+
+    def close(self):
+        pass
+
+
+# نسخه داده‌ها در فایل مشترک بین پروسس‌ها؛ خواندن مستقیماً از mmap و نوشتن با قفل فایل
+class SharedDataVersion(DataVersion):
+    def __init__(self, path: str):
+        # fcntl فقط روی سیستم‌های POSIX وجود دارد و تنها در حالت چند worker لازم است
+        import fcntl
+        self._fcntl = fcntl
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = struct.calcsize(f'{self.SLOTS}q')
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def _get(self, index: int) -> int:
+        return struct.unpack_from('q', self._map, index * 8)[0]
+
+    def _set(self, index: int, value: int):
+        struct.pack_into('q', self._map, index * 8, value)
+
+    def _lock(self):
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+
+    def _unlock(self):
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+def data_version_for(database_path: str) -> DataVersion:
+    if SHARED_DATA_VERSION:
+        return SharedDataVersion(f"{database_path}-version")
+    return DataVersion()
+
+
+# کش فایل‌های اکسل خروجی: kind -> (نسخه داده، کلید، محتوای فایل، file_id تلگرام)
+# تا وقتی نسخه داده و کلید (مثلاً تاریخ اول بازه) تغییر نکرده، همان فایل دوباره ارسال می‌شود
+class ExportCache:
+    def __init__(self, version: DataVersion):
+        self.version = version
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    # (content, file_id) یا None اگر فایل معتبری در کش نباشد
+    def get(self, kind: str, key):
+        entry = self._entries.get(kind)
+        if entry is None or entry[0] != self.version.value or entry[1] != key:
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache='export', result='miss')
+            return None
+        self.hits += 1
+        CACHE_REQUESTS.inc(cache='export', result='hit')
+        return entry[2], entry[3]
+
+    # version باید قبل از خواندن داده‌ها گرفته شود تا تغییرات هم‌زمان با ساخت فایل گم نشوند
+    def set(self, kind: str, key, version: int, content: bytes, file_id: str = None):
+        self._entries[kind] = (version, key, content, file_id)
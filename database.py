@@ -0,0 +1,144 @@
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from metrics import DB_QUERY_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# مسیر فایل دیتابیس
+DB_PATH = os.getenv('DATABASE_PATH', 'food_reservation.db')
+
+# تعداد اتصال‌های ثابت به دیتابیس (هر اتصال در یک ترد جدا)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))
+
+# کوئری‌های کندتر از این مقدار (میلی‌ثانیه) در لاگ ثبت می‌شوند
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+
+# سطح synchronous همه اتصال‌ها (هر اتصال ممکن است بنویسد)؛ FULL پس از هر commit فایل WAL را
+# fsync می‌کند تا رزرو تأیید شده با قطع برق از دست نرود. NORMAL سریع‌تر است اما آخرین
+# تراکنش‌های تأیید شده ممکن است با قطع برق یا کرش سیستم‌عامل از بین بروند.
+DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'FULL')
+
+# تنظیمات هر اتصال؛ journal_mode=WAL در migrations یک بار برای فایل تنظیم می‌شود
+PRAGMAS = (
+    f"PRAGMA synchronous = {DB_SYNCHRONOUS}",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+# لایه دسترسی به دیتابیس
+# کوئری‌ها در تردهای جداگانه اجرا می‌شوند تا event loop ربات بلاک نشود.
+# هر ترد یک اتصال ماندگار به SQLite دارد که بین درخواست‌ها استفاده می‌شود.
+class Database:
+    def __init__(self, path: str = DB_PATH, pool_size: int = DB_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._executor = None
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        # آمار زمان اجرای کوئری‌ها: sql -> [تعداد، مجموع زمان، بیشترین زمان]
+        self.query_stats = {}
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _record(self, label: str, elapsed: float):
+        with self._lock:
+            stats = self.query_stats.setdefault(label, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+        DB_QUERY_LATENCY.observe(elapsed, query=" ".join(label.split())[:80])
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {label}")
+
+    def _timed(self, label: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(self._connection(), *args)
+        finally:
+            self._record(label, time.perf_counter() - start)
+
+    async def _submit(self, label: str, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.pool_size, thread_name_prefix='db'
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(self._timed, label, fn, *args)
+        )
+
+    async def fetchone(self, sql: str, params=()):
+        return await self._submit(sql, _fetchone, sql, params)
+
+    async def fetchall(self, sql: str, params=()):
+        return await self._submit(sql, _fetchall, sql, params)
+
+    # اجرای دستور نوشتنی و commit؛ تعداد سطرهای تغییر یافته برگردانده می‌شود
+    async def execute(self, sql: str, params=()) -> int:
+        return await self._submit(sql, _execute, sql, params)
+
+    async def executemany(self, sql: str, seq_of_params) -> int:
+        return await self._submit(sql, _executemany, sql, list(seq_of_params))
+
+    # اجرای یک تابع همگام با اتصال دیتابیس داخل یک تراکنش
+    # fn(conn, *args) در ترد دیتابیس صدا زده می‌شود
+    async def run(self, fn, *args):
+        return await self._submit(fn.__name__, _transaction, fn, *args)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def _fetchone(conn: sqlite3.Connection, sql: str, params):
+    return conn.execute(sql, params).fetchone()
+
+
+def _fetchall(conn: sqlite3.Connection, sql: str, params):
+    return conn.execute(sql, params).fetchall()
+
+
+def _execute(conn: sqlite3.Connection, sql: str, params) -> int:
+    with conn:
+        return conn.execute(sql, params).rowcount
+
+
+def _executemany(conn: sqlite3.Connection, sql: str, seq_of_params) -> int:
+    with conn:
+        return conn.executemany(sql, seq_of_params).rowcount
+
+
+def _transaction(conn: sqlite3.Connection, fn, *args):
+    with conn:
+        return fn(conn, *args)
+
+
+db = Database()
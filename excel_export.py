@@ -0,0 +1,124 @@
+import io
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.utils import get_column_letter
+
+_pool = None
+
+
+# کوئری pivot: یک سطر برای هر کاربر فعال و یک ستون برای هر تاریخ
+def _schedule_query(date_count: int) -> str:
+    columns = ",\n".join(
+        "MAX(CASE WHEN r.reservation_date = ? THEN m1.name || COALESCE(char(10) || m2.name, '') END)"
+        for _ in range(date_count)
+    )
+    return f'''
+        SELECT u.first_name || ' ' || u.last_name,
+        {columns}
+        FROM users u
+        LEFT JOIN reservations r
+            ON r.user_id = u.user_id AND r.reservation_date BETWEEN ? AND ?
+        LEFT JOIN meals m1 ON r.meal_id = m1.id
+        LEFT JOIN meals m2 ON r.dessert_id = m2.id
+        WHERE u.is_active = 1
+        GROUP BY u.user_id
+        ORDER BY u.first_name
+    '''
+
+
+# کوئری pivot خلاصه آشپزخانه: یک سطر برای هر غذا/دسر و تعداد رزرو آن در هر تاریخ
+# مستقیماً از جدول daily_meal_counts خوانده می‌شود
+def _summary_query(date_count: int) -> str:
+    columns = ",\n".join(
+        "MAX(CASE WHEN c.reservation_date = ? THEN c.count END)"
+        for _ in range(date_count)
+    )
+    return f'''
+        SELECT CASE m.type WHEN 'meal' THEN '🍽 ' ELSE '🍰 ' END || m.name,
+        {columns}
+        FROM daily_meal_counts c
+        JOIN meals m ON m.id = c.item_id
+        WHERE c.reservation_date BETWEEN ? AND ? AND c.count > 0
+        GROUP BY m.id
+        ORDER BY m.type DESC, m.name
+    '''
+
+
+# دریافت کل جدول کاربر × تاریخ با یک کوئری
+async def fetch_schedule(db, dates: list) -> list:
+    return await db.fetchall(_schedule_query(len(dates)), (*dates, dates[0], dates[-1]))
+
+
+# دریافت جدول غذا × تاریخ با یک کوئری
+async def fetch_summary(db, dates: list) -> list:
+    return await db.fetchall(_summary_query(len(dates)), (*dates, dates[0], dates[-1]))
+
+
+# ساخت فایل اکسل در حالت write-only (در پروسس جداگانه اجرا می‌شود)
+# هر سطر: عنوان سطر و سپس مقدار هر ستون
+def build_workbook(title: str, headers: list, rows: list) -> bytes:
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    # تنظیم عرض ستون‌ها
+    ws.column_dimensions['A'].width = 20
+    for col in range(2, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+
+    # تنظیمات استایل
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    center_alignment = Alignment(horizontal="center", vertical="center")
+
+    def centered(value):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.alignment = center_alignment
+        return cell
+
+    # سرستون‌ها
+    header_row = []
+    for header in headers:
+        cell = centered(header)
+        cell.fill = header_fill
+        cell.font = header_font
+        header_row.append(cell)
+    ws.append(header_row)
+
+    # پر کردن داده‌ها
+    for label, *cells in rows:
+        ws.append(
+            [centered(label)]
+            + [centered(value) if value is not None else None for value in cells]
+        )
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+# پروسس کارگر با spawn ساخته می‌شود، نه fork: تردهای دیتابیس، httpx و JobQueue در حال اجرا هستند
+# و fork ممکن است قفل گرفته شده یکی از آن‌ها (مثلاً logging) را به پروسس جدید ببرد.
+# راه‌اندازی spawn کند است، پس start هنگام شروع ربات پروسس را از پیش بالا می‌آورد.
+def start():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        _pool.submit(int)
+
+
+# اجرای ساخت فایل در پروسس کارگر تا event loop ربات آزاد بماند
+async def render_workbook(title: str, headers: list, rows: list) -> bytes:
+    start()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool, build_workbook, title, headers, rows)
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,113 @@
+from datetime import date
+from functools import lru_cache
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# نام روزهای هفته
+WEEKDAYS = ('شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه')
+
+# تعداد روزهای قابل رزرو
+RESERVATION_DAYS = 14
+
+# تعداد روزهای نمایش داده شده در خلاصه آشپزخانه
+KITCHEN_SUMMARY_DAYS = 7
+
+# تعداد روزهای گذشته در گزارش تاریخچه
+HISTORY_DAYS = 30
+
+
+def _back(callback_data: str) -> InlineKeyboardButton:
+    return InlineKeyboardButton("🔙 بازگشت", callback_data=callback_data)
+
+
+# دکمه‌های بازگشت
+BACK_TO_ADMIN_BUTTON = _back('back_to_admin')
+BACK_TO_MAIN_BUTTON = _back('back_to_main')
+BACK_TO_ADMIN_USERS_BUTTON = _back('admin_users')
+BACK_TO_ADMIN_MEALS_BUTTON = _back('admin_meals')
+BACK_TO_RESERVE_FOOD_BUTTON = _back('reserve_food')
+
+BACK_TO_ADMIN = InlineKeyboardMarkup([[BACK_TO_ADMIN_BUTTON]])
+BACK_TO_MAIN = InlineKeyboardMarkup([[BACK_TO_MAIN_BUTTON]])
+BACK_TO_ADMIN_MEALS = InlineKeyboardMarkup([[BACK_TO_ADMIN_MEALS_BUTTON]])
+
+# خلاصه آشپزخانه
+KITCHEN_SUMMARY_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📥 دریافت خلاصه دو هفته (اکسل)", callback_data='kitchen_summary_excel')],
+    [BACK_TO_ADMIN_BUTTON]
+])
+
+# منوی اصلی ادمین
+ADMIN_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("👥 مدیریت کاربران", callback_data='admin_users')],
+    [InlineKeyboardButton("🍽 مدیریت غذاها", callback_data='admin_meals')],
+    [InlineKeyboardButton("📊 مشاهده رزروها", callback_data='admin_view_reservations')],
+    [InlineKeyboardButton("👨‍🍳 خلاصه آشپزخانه", callback_data='kitchen_summary')],
+    [InlineKeyboardButton("🗂 تاریخچه رزروها", callback_data='reservation_history')],
+    [InlineKeyboardButton("📥 دریافت فایل اکسل", callback_data='admin_export_excel')],
+    [InlineKeyboardButton("📢 ارسال پیام همگانی", callback_data='admin_broadcast')]
+])
+
+# منوی اصلی کاربر
+USER_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🍽 رزرو غذا", callback_data='reserve_food')],
+    [InlineKeyboardButton("📋 رزروهای من", callback_data='my_reservations')]
+])
+
+# مدیریت کاربران
+ADMIN_USERS_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ افزودن کاربر", callback_data='add_user')],
+    [InlineKeyboardButton("📤 افزودن گروهی از فایل", callback_data='import_users')],
+    [InlineKeyboardButton("📋 لیست کاربران", callback_data='list_users')],
+    [BACK_TO_ADMIN_BUTTON]
+])
+
+# مدیریت غذاها
+ADMIN_MEALS_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ افزودن غذا", callback_data='add_meal')],
+    [InlineKeyboardButton("➕ افزودن دسر", callback_data='add_dessert')],
+    [InlineKeyboardButton("📤 بارگذاری منوی هفتگی از اکسل", callback_data='import_menu')],
+    [InlineKeyboardButton("📋 لیست غذاها", callback_data='list_meals')],
+    [BACK_TO_ADMIN_BUTTON]
+])
+
+
+def _weekdays_menu(prefix: str) -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton(day, callback_data=f'{prefix}{i}')]
+        for i, day in enumerate(WEEKDAYS)
+    ]
+    keyboard.append([BACK_TO_ADMIN_MEALS_BUTTON])
+    return InlineKeyboardMarkup(keyboard)
+
+
+# انتخاب روز هفته برای غذا و دسر
+MEAL_DAYS_MENU = _weekdays_menu('day_meal_')
+DESSERT_DAYS_MENU = _weekdays_menu('day_dessert_')
+
+
+# callback_data مراحل رزرو همه انتخاب‌های قبلی را با خود دارد (بدون user_data):
+#   rd:<ordinal تاریخ>                 انتخاب روز
+#   rm:<ordinal تاریخ>:<meal>          انتخاب غذا
+#   rs:<ordinal تاریخ>:<meal>:<dessert> انتخاب دسر (0 = بدون دسر)
+# کوتاه‌ترین شکل ممکن تا همیشه زیر محدودیت 64 بایتی تلگرام بماند
+def reserve_day_data(day: date) -> str:
+    return f'rd:{day.toordinal()}'
+
+
+def reserve_meal_data(day: date, meal_id: int) -> str:
+    return f'rm:{day.toordinal()}:{meal_id}'
+
+
+def reserve_dessert_data(day: date, meal_id: int, dessert_id) -> str:
+    return f'rs:{day.toordinal()}:{meal_id}:{dessert_id or 0}'
+
+
+# لیست روزهای قابل رزرو (booking_calendar.days)؛ برای هر روز تقویم فقط یک بار ساخته می‌شود
+@lru_cache(maxsize=2)
+def reserve_days_menu(days: tuple) -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton(f"{day.name} - {day.short}", callback_data=reserve_day_data(day.date))]
+        for day in days
+    ]
+    keyboard.append([BACK_TO_MAIN_BUTTON])
+    return InlineKeyboardMarkup(keyboard)
@@ -1,6 +1,6 @@
 import os
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
@@ -12,9 +12,64 @@ from telegram.ext import (
     filters
 )
 import sqlite3
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+from database import db
+from migrations import migrate
+from tenants import TenantContext, TenantUpdateProcessor, current_tenant, tenant_manager
+from persistence import SQLitePersistence
+from admission import admit_callback
+from user_import import MAX_IMPORT_BYTES, import_users
+from menu_import import import_menu
+import excel_export
+from archive import ARCHIVE_INTERVAL, archive_reservations
+from booking_calendar import booking_calendar, day_info, refresh_calendar
+from broadcast import Broadcast
+from keyboards import (
+    WEEKDAYS,
+    HISTORY_DAYS,
+    ADMIN_MENU,
+    USER_MENU,
+    ADMIN_USERS_MENU,
+    ADMIN_MEALS_MENU,
+    MEAL_DAYS_MENU,
+    DESSERT_DAYS_MENU,
+    BACK_TO_ADMIN,
+    BACK_TO_MAIN,
+    BACK_TO_ADMIN_MEALS,
+    KITCHEN_SUMMARY_MENU,
+    BACK_TO_ADMIN_BUTTON,
+    BACK_TO_ADMIN_USERS_BUTTON,
+    BACK_TO_RESERVE_FOOD_BUTTON,
+    reserve_days_menu,
+    reserve_day_data,
+    reserve_meal_data,
+    reserve_dessert_data
+)
+import metrics
+from metrics import METRICS_PORT, Gauge, InstrumentedRequest, registry, timed
+from update_processor import MAX_CONCURRENT_UPDATES
+from router import CallbackRouter, reservation_parser
+from render import (
+    edit_if_changed,
+    users_text,
+    meals_text,
+    my_reservations_text,
+    reservations_text,
+    kitchen_summary_text,
+    history_text
+)
+from pagination import (
+    USERS_PAGE_SIZE,
+    RESERVATIONS_PAGE_SIZE,
+    fetch_page,
+    fit_page,
+    nav_buttons,
+    cursor_with_name,
+    parse_user_cursor,
+    parse_reservation_cursor
+)
 import json
+import asyncio
+from webhook_workers import WEBHOOK_SECRET, WEBHOOK_WORKERS, run_front, run_worker
 
 # تنظیمات لاگ
 logging.basicConfig(
@@ -23,96 +78,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# آیدی ادمین - اینجا را تغییر دهید
-ADMIN_ID = 166152961  # آیدی عددی تلگرام ادمین
-
 # States برای ConversationHandler
 (ADD_MEAL, ADD_DESSERT, ADD_USER_ID, ADD_USER_NAME, 
- SELECT_DAY_MEAL, SELECT_DAY_DESSERT, BROADCAST_MSG) = range(7)
+ SELECT_DAY_MEAL, SELECT_DAY_DESSERT, BROADCAST_MSG, IMPORT_USERS,
+ IMPORT_MENU) = range(9)
 
 # Database initialization
 def init_db():
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
-    
-    # جدول کاربران
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (user_id INTEGER PRIMARY KEY,
-                  first_name TEXT NOT NULL,
-                  last_name TEXT NOT NULL,
-                  is_active INTEGER DEFAULT 1,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    # جدول غذاها
-    c.execute('''CREATE TABLE IF NOT EXISTS meals
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT NOT NULL,
-                  type TEXT NOT NULL,
-                  day_of_week INTEGER NOT NULL,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    # جدول رزروها
-    c.execute('''CREATE TABLE IF NOT EXISTS reservations
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER NOT NULL,
-                  meal_id INTEGER,
-                  dessert_id INTEGER,
-                  reservation_date DATE NOT NULL,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (user_id) REFERENCES users (user_id),
-                  FOREIGN KEY (meal_id) REFERENCES meals (id),
-                  FOREIGN KEY (dessert_id) REFERENCES meals (id),
-                  UNIQUE(user_id, reservation_date))''')
-    
-    # جدول تنظیمات
-    c.execute('''CREATE TABLE IF NOT EXISTS settings
-                 (key TEXT PRIMARY KEY,
-                  value TEXT NOT NULL)''')
-    
-    conn.commit()
+    conn = db.connect()
+    migrate(conn)
     conn.close()
 
-# تابع کمکی برای بررسی ادمین بودن
+# تابع کمکی برای بررسی ادمین بودن (در سلف کاربر)
 def is_admin(user_id: int) -> bool:
-    return user_id == ADMIN_ID
+    tenant = current_tenant()
+    return tenant is not None and tenant.is_admin(user_id)
 
 # تابع کمکی برای بررسی کاربر مجاز
-def is_authorized_user(user_id: int) -> bool:
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
-    c.execute("SELECT is_active FROM users WHERE user_id = ?", (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result is not None and result[0] == 1
+async def is_authorized_user(user_id: int) -> bool:
+    tenant = current_tenant()
+    return tenant is not None and await tenant.is_authorized(user_id)
+
+# پایان مکالمه برای کاربری که سلف ندارد (مثلاً ادمینی که از تنظیمات سلف‌ها حذف شده)
+async def deny_conversation(update: Update):
+    await update.effective_message.reply_text("شما دسترسی ندارید.")
+    return ConversationHandler.END
 
 # دستور start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     if is_admin(user.id):
-        keyboard = [
-            [InlineKeyboardButton("👥 مدیریت کاربران", callback_data='admin_users')],
-            [InlineKeyboardButton("🍽 مدیریت غذاها", callback_data='admin_meals')],
-            [InlineKeyboardButton("📊 مشاهده رزروها", callback_data='admin_view_reservations')],
-            [InlineKeyboardButton("📥 دریافت فایل اکسل", callback_data='admin_export_excel')],
-            [InlineKeyboardButton("📢 ارسال پیام همگانی", callback_data='admin_broadcast')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
         await update.message.reply_text(
             f"سلام ادمین عزیز {user.first_name}!\n\n"
             "به پنل مدیریت ربات رزرو غذا خوش آمدید.",
-            reply_markup=reply_markup
+            reply_markup=ADMIN_MENU
         )
-    elif is_authorized_user(user.id):
-        keyboard = [
-            [InlineKeyboardButton("🍽 رزرو غذا", callback_data='reserve_food')],
-            [InlineKeyboardButton("📋 رزروهای من", callback_data='my_reservations')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        pending = await context.tenant.db.fetchone("SELECT COUNT(*) FROM weekday_fix_notices")
+        if pending[0]:
+            await update.message.reply_text(
+                f"⚠️ {pending[0]} رزرو آینده پیش از اصلاح روزهای هفته از منوی روز اشتباه ثبت شده است.\n"
+                "برای اطلاع دادن به این کاربران /weekday_notices را ارسال کنید."
+            )
+    elif await is_authorized_user(user.id):
         await update.message.reply_text(
             f"سلام {user.first_name}!\n\n"
             "به ربات رزرو غذا خوش آمدید.",
-            reply_markup=reply_markup
+            reply_markup=USER_MENU
         )
     else:
         await update.message.reply_text(
@@ -125,18 +137,10 @@ async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    keyboard = [
-        [InlineKeyboardButton("👥 مدیریت کاربران", callback_data='admin_users')],
-        [InlineKeyboardButton("🍽 مدیریت غذاها", callback_data='admin_meals')],
-        [InlineKeyboardButton("📊 مشاهده رزروها", callback_data='admin_view_reservations')],
-        [InlineKeyboardButton("📥 دریافت فایل اکسل", callback_data='admin_export_excel')],
-        [InlineKeyboardButton("📢 ارسال پیام همگانی", callback_data='admin_broadcast')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
+    await edit_if_changed(
+        query,
         "پنل مدیریت ربات رزرو غذا:",
-        reply_markup=reply_markup
+        reply_markup=ADMIN_MENU
     )
 
 # مدیریت کاربران
@@ -144,24 +148,24 @@ async def admin_users_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    keyboard = [
-        [InlineKeyboardButton("➕ افزودن کاربر", callback_data='add_user')],
-        [InlineKeyboardButton("📋 لیست کاربران", callback_data='list_users')],
-        [InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_admin')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
+    await edit_if_changed(
+        query,
         "مدیریت کاربران:",
-        reply_markup=reply_markup
+        reply_markup=ADMIN_USERS_MENU
     )
 
 # شروع افزودن کاربر
 async def start_add_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+    
+    if not is_admin(update.effective_user.id):
+        await query.answer("شما دسترسی ندارید.", show_alert=True)
+        return ConversationHandler.END
+    
     await query.answer()
     
-    await query.edit_message_text(
+    await edit_if_changed(
+        query,
         "لطفاً آیدی عددی کاربر را وارد کنید:\n\n"
         "برای لغو /cancel را ارسال کنید."
     )
@@ -188,6 +192,9 @@ async def receive_user_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # دریافت نام کاربر
 async def receive_user_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant = context.tenant
+    if tenant is None:
+        return await deny_conversation(update)
     name_parts = update.message.text.strip().split(' ', 1)
     
     if len(name_parts) < 2:
@@ -200,15 +207,13 @@ async def receive_user_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     first_name, last_name = name_parts[0], name_parts[1]
     user_id = context.user_data['new_user_id']
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
-    
     try:
-        c.execute(
+        await tenant.db.execute(
             "INSERT INTO users (user_id, first_name, last_name) VALUES (?, ?, ?)",
             (user_id, first_name, last_name)
         )
-        conn.commit()
+        tenant.data_version.bump(users=True, user_ids=[user_id])
+        await tenant_manager.assign([user_id], tenant.name)
         await update.message.reply_text(
             f"✅ کاربر {first_name} {last_name} با موفقیت اضافه شد!\n\n"
             "برای بازگشت به منو /start را ارسال کنید."
@@ -218,51 +223,114 @@ async def receive_user_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "❌ این کاربر قبلاً ثبت شده است.\n\n"
             "برای بازگشت به منو /start را ارسال کنید."
         )
-    finally:
-        conn.close()
     
     return ConversationHandler.END
 
+# شروع افزودن گروهی کاربران از فایل
+async def start_import_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    
+    if not is_admin(update.effective_user.id):
+        await query.answer("شما دسترسی ندارید.", show_alert=True)
+        return ConversationHandler.END
+    
+    await query.answer()
+    await edit_if_changed(
+        query,
+        "📤 فایل CSV یا XLSX کاربران را ارسال کنید.\n\n"
+        "ستون‌ها به ترتیب: user_id, first_name, last_name\n"
+        "(سطر عنوان اختیاری است)\n\n"
+        "برای لغو /cancel را ارسال کنید."
+    )
+    
+    return IMPORT_USERS
+
+# دریافت فایل کاربران
+async def receive_users_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant = context.tenant
+    if tenant is None:
+        return await deny_conversation(update)
+    document = update.message.document
+    filename = document.file_name or ''
+    
+    if not filename.lower().endswith(('.csv', '.xlsx')):
+        await update.message.reply_text("فقط فایل CSV یا XLSX قابل قبول است. دوباره تلاش کنید:")
+        return IMPORT_USERS
+    
+    if document.file_size and document.file_size > MAX_IMPORT_BYTES:
+        await update.message.reply_text("حجم فایل بیش از حد مجاز است. دوباره تلاش کنید:")
+        return IMPORT_USERS
+    
+    file = await document.get_file()
+    content = bytes(await file.download_as_bytearray())
+    
+    try:
+        result = await tenant.db.run(import_users, content, filename)
+    except Exception as e:
+        logger.error(f"User import failed: {e}")
+        await update.message.reply_text(
+            f"❌ خطا در خواندن فایل: {str(e)}\n\n"
+            "برای بازگشت به منو /start را ارسال کنید."
+        )
+        return ConversationHandler.END
+    
+    tenant.data_version.bump(users=True, user_ids=result.user_ids)
+    await tenant_manager.assign(result.user_ids, tenant.name)
+    
+    text = (
+        "✅ بارگذاری کاربران انجام شد.\n\n"
+        f"➕ جدید: {result.inserted}\n"
+        f"✏️ به‌روزرسانی: {result.updated}\n"
+        f"❌ رد شده: {len(result.rejected)}\n"
+    )
+    if result.rejected:
+        text += "\n" + "\n".join(f"• سطر {line}: {reason}" for line, reason in result.rejected[:20]) + "\n"
+        if len(result.rejected) > 20:
+            text += f"... و {len(result.rejected) - 20} سطر دیگر\n"
+    text += "\nبرای بازگشت به منو /start را ارسال کنید."
+    
+    await update.message.reply_text(text)
+    return ConversationHandler.END
+
 # لیست کاربران
-async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE, forward: bool = True, cursor: tuple = None):
+    tenant = context.tenant
     query = update.callback_query
     await query.answer()
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
-    c.execute("SELECT user_id, first_name, last_name, is_active FROM users ORDER BY first_name")
-    users = c.fetchall()
-    conn.close()
+    page = await fetch_page(
+        tenant.db,
+        "SELECT user_id, first_name, last_name, is_active FROM users "
+        "WHERE {keyset} ORDER BY {order} LIMIT ?",
+        ('first_name', 'user_id'),
+        # اگر کاربر cursor حذف شده باشد از نام ذخیره شده در cursor استفاده می‌شود
+        "COALESCE((SELECT first_name FROM users WHERE user_id = ?), ?), ?",
+        (),
+        None if cursor is None else (cursor[0], cursor[1], cursor[0]),
+        forward,
+        USERS_PAGE_SIZE
+    )
     
-    if not users:
-        text = "هیچ کاربری ثبت نشده است."
-    else:
-        text = "📋 لیست کاربران:\n\n"
-        for user_id, first_name, last_name, is_active in users:
-            status = "✅ فعال" if is_active else "❌ غیرفعال"
-            text += f"• {first_name} {last_name} ({user_id}) - {status}\n"
+    text = fit_page(page, users_text)
     
-    keyboard = [[InlineKeyboardButton("🔙 بازگشت", callback_data='admin_users')]]
+    keyboard = []
+    nav = nav_buttons(page, 'users_page_', lambda row: cursor_with_name('users_page_', row[0], row[1]))
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([BACK_TO_ADMIN_USERS_BUTTON])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.edit_message_text(text, reply_markup=reply_markup)
+    await edit_if_changed(query, text, reply_markup=reply_markup)
 
 # مدیریت غذاها
 async def admin_meals_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    keyboard = [
-        [InlineKeyboardButton("➕ افزودن غذا", callback_data='add_meal')],
-        [InlineKeyboardButton("➕ افزودن دسر", callback_data='add_dessert')],
-        [InlineKeyboardButton("📋 لیست غذاها", callback_data='list_meals')],
-        [InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_admin')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
+    await edit_if_changed(
+        query,
         "مدیریت غذاها و دسرها:",
-        reply_markup=reply_markup
+        reply_markup=ADMIN_MEALS_MENU
     )
 
 # انتخاب روز برای غذا
@@ -272,16 +340,10 @@ async def select_day_for_meal(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     context.user_data['meal_type'] = 'meal'
     
-    days = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه']
-    keyboard = []
-    for i, day in enumerate(days):
-        keyboard.append([InlineKeyboardButton(day, callback_data=f'day_meal_{i}')])
-    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='admin_meals')])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
+    await edit_if_changed(
+        query,
         "روز هفته را انتخاب کنید:",
-        reply_markup=reply_markup
+        reply_markup=MEAL_DAYS_MENU
     )
 
 # انتخاب روز برای دسر
@@ -291,33 +353,36 @@ async def select_day_for_dessert(update: Update, context: ContextTypes.DEFAULT_T
     
     context.user_data['meal_type'] = 'dessert'
     
-    days = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه']
-    keyboard = []
-    for i, day in enumerate(days):
-        keyboard.append([InlineKeyboardButton(day, callback_data=f'day_dessert_{i}')])
-    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='admin_meals')])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
+    await edit_if_changed(
+        query,
         "روز هفته را انتخاب کنید:",
-        reply_markup=reply_markup
+        reply_markup=DESSERT_DAYS_MENU
     )
 
-# دریافت نام غذا
+# دریافت نام غذا؛ callback_data به شکل day_meal_<روز> یا day_dessert_<روز> است
 async def receive_meal_day(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+    
+    if not is_admin(update.effective_user.id):
+        await query.answer("شما دسترسی ندارید.", show_alert=True)
+        return ConversationHandler.END
+    
     await query.answer()
     
-    day = int(query.data.split('_')[-1])
-    meal_type = context.user_data.get('meal_type', 'meal')
+    _, meal_type, day = query.data.split('_', 2)
+    if meal_type not in ('meal', 'dessert') or not day.isdigit() or int(day) >= len(WEEKDAYS):
+        logger.warning(f"Invalid meal day callback: {query.data!r}")
+        return ConversationHandler.END
+    day = int(day)
     
+    context.user_data['meal_type'] = meal_type
     context.user_data['meal_day'] = day
     
-    days = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه']
     meal_type_fa = 'غذا' if meal_type == 'meal' else 'دسر'
     
-    await query.edit_message_text(
-        f"نام {meal_type_fa} برای روز {days[day]} را وارد کنید:\n\n"
+    await edit_if_changed(
+        query,
+        f"نام {meal_type_fa} برای روز {WEEKDAYS[day]} را وارد کنید:\n\n"
         "برای لغو /cancel را ارسال کنید."
     )
     
@@ -325,62 +390,106 @@ async def receive_meal_day(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ذخیره غذا یا دسر
 async def save_meal(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant = context.tenant
+    if tenant is None:
+        return await deny_conversation(update)
     meal_name = update.message.text.strip()
     day = context.user_data['meal_day']
     meal_type = context.user_data.get('meal_type', 'meal')
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
-    
-    c.execute(
+    await tenant.db.execute(
         "INSERT INTO meals (name, type, day_of_week) VALUES (?, ?, ?)",
         (meal_name, meal_type, day)
     )
-    conn.commit()
-    conn.close()
+    tenant.data_version.bump(meals=True)
     
-    days = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه']
     meal_type_fa = 'غذا' if meal_type == 'meal' else 'دسر'
     
     await update.message.reply_text(
-        f"✅ {meal_type_fa} '{meal_name}' برای روز {days[day]} اضافه شد!\n\n"
+        f"✅ {meal_type_fa} '{meal_name}' برای روز {WEEKDAYS[day]} اضافه شد!\n\n"
         "برای بازگشت به منو /start را ارسال کنید."
     )
     
     return ConversationHandler.END
 
-# لیست غذاها
-async def list_meals(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# شروع بارگذاری منوی هفتگی از فایل
+async def start_import_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+    
+    if not is_admin(update.effective_user.id):
+        await query.answer("شما دسترسی ندارید.", show_alert=True)
+        return ConversationHandler.END
+    
     await query.answer()
+    await edit_if_changed(
+        query,
+        "📤 فایل اکسل منوی هفتگی را ارسال کنید.\n\n"
+        "ستون اول: روز هفته (شنبه تا جمعه)\n"
+        "ستون دوم: غذاها، ستون سوم: دسرها\n"
+        "چند غذا در یک خانه را با ویرگول یا خط جدید جدا کنید.\n\n"
+        "منوی فعلی با منوی فایل جایگزین می‌شود؛ برای اضافه شدن به منوی فعلی "
+        "در توضیح فایل کلمه «ادغام» را بنویسید.\n\n"
+        "برای لغو /cancel را ارسال کنید."
+    )
+    
+    return IMPORT_MENU
+
+# دریافت فایل منوی هفتگی
+async def receive_menu_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant = context.tenant
+    if tenant is None:
+        return await deny_conversation(update)
+    document = update.message.document
+    filename = document.file_name or ''
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
+    if not filename.lower().endswith(('.csv', '.xlsx')):
+        await update.message.reply_text("فقط فایل XLSX یا CSV قابل قبول است. دوباره تلاش کنید:")
+        return IMPORT_MENU
     
-    days = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه']
-    text = "📋 لیست غذاها و دسرها:\n\n"
+    if document.file_size and document.file_size > MAX_IMPORT_BYTES:
+        await update.message.reply_text("حجم فایل بیش از حد مجاز است. دوباره تلاش کنید:")
+        return IMPORT_MENU
     
-    for i, day in enumerate(days):
-        text += f"📅 {day}:\n"
-        
-        c.execute("SELECT name FROM meals WHERE day_of_week = ? AND type = 'meal'", (i,))
-        meals = c.fetchall()
-        if meals:
-            text += "  🍽 غذاها: " + ", ".join([m[0] for m in meals]) + "\n"
-        
-        c.execute("SELECT name FROM meals WHERE day_of_week = ? AND type = 'dessert'", (i,))
-        desserts = c.fetchall()
-        if desserts:
-            text += "  🍰 دسرها: " + ", ".join([d[0] for d in desserts]) + "\n"
-        
-        text += "\n"
+    caption = (update.message.caption or '').lower()
+    replace = 'ادغام' not in caption and 'merge' not in caption
     
-    conn.close()
+    file = await document.get_file()
+    content = bytes(await file.download_as_bytearray())
     
-    keyboard = [[InlineKeyboardButton("🔙 بازگشت", callback_data='admin_meals')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    try:
+        result = await tenant.db.run(import_menu, content, filename, replace, booking_calendar.today.iso)
+    except Exception as e:
+        logger.error(f"Menu import failed: {e}")
+        await update.message.reply_text(
+            f"❌ خطا در خواندن فایل: {str(e)}\n\n"
+            "برای بازگشت به منو /start را ارسال کنید."
+        )
+        return ConversationHandler.END
+    
+    tenant.data_version.bump(meals=True)
+    
+    text = (
+        f"✅ منوی هفتگی {'جایگزین' if replace else 'ادغام'} شد.\n\n"
+        f"➕ اضافه شده: {result.added}\n"
+        f"➖ حذف شده: {result.removed}\n"
+        f"❌ رد شده: {len(result.rejected)}\n"
+    )
+    if result.kept:
+        text += f"🔒 {result.kept} غذا در فایل نبود و از منو برداشته شد؛ رزروهای آینده آن باقی ماندند.\n"
+    if result.rejected:
+        text += "\n" + "\n".join(f"• سطر {line}: {reason}" for line, reason in result.rejected[:20]) + "\n"
+    text += "\nبرای بازگشت به منو /start را ارسال کنید."
     
-    await query.edit_message_text(text, reply_markup=reply_markup)
+    await update.message.reply_text(text)
+    return ConversationHandler.END
+
+# لیست غذاها
+async def list_meals(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant = context.tenant
+    query = update.callback_query
+    await query.answer()
+    
+    await edit_if_changed(query, meals_text(tenant.menu_cache), reply_markup=BACK_TO_ADMIN_MEALS)
 
 # رزرو غذا توسط کاربران
 async def reserve_food_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -388,43 +497,44 @@ async def reserve_food_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     # نمایش 14 روز آینده
-    keyboard = []
-    today = datetime.now().date()
-    
-    for i in range(14):
-        date = today + timedelta(days=i)
-        day_name = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه'][date.weekday()]
-        date_str = date.strftime('%Y-%m-%d')
-        button_text = f"{day_name} - {date.strftime('%d/%m')}"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=f'reserve_{date_str}')])
-    
-    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
+    await edit_if_changed(
+        query,
         "روز مورد نظر برای رزرو را انتخاب کنید:",
-        reply_markup=reply_markup
+        reply_markup=reserve_days_menu(booking_calendar.days)
+    )
+
+# تاریخ callback_data از سمت کاربر می‌آید و ممکن است قدیمی یا ساختگی باشد؛
+# فقط روزهای بازه رزرو فعلی (booking_calendar.day) پذیرفته می‌شوند
+async def reject_stale_choice(query):
+    await edit_if_changed(
+        query,
+        "❌ این گزینه دیگر معتبر نیست.\n\n"
+        "لطفاً دوباره روز مورد نظر را انتخاب کنید.",
+        reply_markup=InlineKeyboardMarkup([[BACK_TO_RESERVE_FOOD_BUTTON]])
     )
 
+# دکمه رزروی که callback_data آن قابل خواندن نیست
+async def reject_invalid_reservation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    await reject_stale_choice(query)
+
 # انتخاب غذا برای رزرو
-async def select_meal_for_reservation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def select_meal_for_reservation(update: Update, context: ContextTypes.DEFAULT_TYPE, date):
+    tenant = context.tenant
     query = update.callback_query
     await query.answer()
     
-    date_str = query.data.split('_')[1]
-    date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    day_of_week = date.weekday()
-    
-    context.user_data['reservation_date'] = date_str
+    day = booking_calendar.day(date)
+    if day is None:
+        await reject_stale_choice(query)
+        return
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
-    c.execute("SELECT id, name FROM meals WHERE day_of_week = ? AND type = 'meal'", (day_of_week,))
-    meals = c.fetchall()
-    conn.close()
+    meals = tenant.menu_cache.items(day.weekday, 'meal')
     
     if not meals:
-        await query.edit_message_text(
+        await edit_if_changed(
+            query,
             "❌ برای این روز غذایی تعریف نشده است.\n\n"
             "برای بازگشت /start را ارسال کنید."
         )
@@ -432,267 +542,246 @@ async def select_meal_for_reservation(update: Update, context: ContextTypes.DEFA
     
     keyboard = []
     for meal_id, meal_name in meals:
-        keyboard.append([InlineKeyboardButton(meal_name, callback_data=f'meal_{meal_id}')])
-    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='reserve_food')])
+        keyboard.append([InlineKeyboardButton(meal_name, callback_data=reserve_meal_data(date, meal_id))])
+    keyboard.append([BACK_TO_RESERVE_FOOD_BUTTON])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    day_name = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه'][day_of_week]
-    await query.edit_message_text(
-        f"غذای خود را برای {day_name} انتخاب کنید:",
+    await edit_if_changed(
+        query,
+        f"غذای خود را برای {day.name} انتخاب کنید:",
         reply_markup=reply_markup
     )
 
 # انتخاب دسر برای رزرو
-async def select_dessert_for_reservation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def select_dessert_for_reservation(update: Update, context: ContextTypes.DEFAULT_TYPE, date, meal_id: int):
+    tenant = context.tenant
     query = update.callback_query
     await query.answer()
     
-    meal_id = int(query.data.split('_')[1])
-    context.user_data['selected_meal_id'] = meal_id
-    
-    date_str = context.user_data['reservation_date']
-    date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    day_of_week = date.weekday()
+    day = booking_calendar.day(date)
+    if day is None or meal_id not in dict(tenant.menu_cache.items(day.weekday, 'meal')):
+        await reject_stale_choice(query)
+        return
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
-    c.execute("SELECT id, name FROM meals WHERE day_of_week = ? AND type = 'dessert'", (day_of_week,))
-    desserts = c.fetchall()
-    conn.close()
+    desserts = tenant.menu_cache.items(day.weekday, 'dessert')
     
     keyboard = []
     for dessert_id, dessert_name in desserts:
-        keyboard.append([InlineKeyboardButton(dessert_name, callback_data=f'dessert_{dessert_id}')])
-    keyboard.append([InlineKeyboardButton("بدون دسر", callback_data='dessert_none')])
-    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data=f'reserve_{date_str}')])
+        keyboard.append([InlineKeyboardButton(dessert_name, callback_data=reserve_dessert_data(date, meal_id, dessert_id))])
+    keyboard.append([InlineKeyboardButton("بدون دسر", callback_data=reserve_dessert_data(date, meal_id, None))])
+    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data=reserve_day_data(date))])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.edit_message_text(
+    await edit_if_changed(
+        query,
         "دسر خود را انتخاب کنید:",
         reply_markup=reply_markup
     )
 
 # تکمیل رزرو
-async def complete_reservation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def complete_reservation(update: Update, context: ContextTypes.DEFAULT_TYPE, date, meal_id: int, dessert_id: int):
+    tenant = context.tenant
     query = update.callback_query
     await query.answer()
     
-    dessert_id = None if query.data == 'dessert_none' else int(query.data.split('_')[1])
-    meal_id = context.user_data['selected_meal_id']
-    date_str = context.user_data['reservation_date']
-    user_id = update.effective_user.id
+    day = booking_calendar.day(date)
+    dessert_id = dessert_id or None
+    if (day is None
+            or meal_id not in dict(tenant.menu_cache.items(day.weekday, 'meal'))
+            or (dessert_id is not None and dessert_id not in dict(tenant.menu_cache.items(day.weekday, 'dessert')))):
+        await reject_stale_choice(query)
+        return
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
+    user_id = update.effective_user.id
     
     try:
-        c.execute(
-            "INSERT OR REPLACE INTO reservations (user_id, meal_id, dessert_id, reservation_date) VALUES (?, ?, ?, ?)",
-            (user_id, meal_id, dessert_id, date_str)
-        )
-        conn.commit()
+        await tenant.reservation_writer.reserve(user_id, meal_id, dessert_id, day.iso)
         
         # دریافت نام غذا و دسر
-        c.execute("SELECT name FROM meals WHERE id = ?", (meal_id,))
-        meal_name = c.fetchone()[0]
+        meal_name = tenant.menu_cache.name(meal_id)
         
         dessert_name = "بدون دسر"
         if dessert_id:
-            c.execute("SELECT name FROM meals WHERE id = ?", (dessert_id,))
-            dessert_name = c.fetchone()[0]
+            dessert_name = tenant.menu_cache.name(dessert_id)
         
-        date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        day_name = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه'][date.weekday()]
-        
-        await query.edit_message_text(
+        await edit_if_changed(
+            query,
             f"✅ رزرو شما ثبت شد!\n\n"
-            f"📅 روز: {day_name} - {date.strftime('%d/%m/%Y')}\n"
+            f"📅 روز: {day.name} - {day.full}\n"
             f"🍽 غذا: {meal_name}\n"
             f"🍰 دسر: {dessert_name}\n\n"
             "برای بازگشت به منو /start را ارسال کنید."
         )
     except Exception as e:
-        await query.edit_message_text(
+        await edit_if_changed(
+            query,
             f"❌ خطا در ثبت رزرو: {str(e)}\n\n"
             "برای بازگشت /start را ارسال کنید."
         )
-    finally:
-        conn.close()
 
 # مشاهده رزروهای کاربر
 async def my_reservations(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant = context.tenant
     query = update.callback_query
     await query.answer()
     
     user_id = update.effective_user.id
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
-    
-    c.execute('''
+    reservations = await tenant.db.fetchall('''
         SELECT r.reservation_date, m1.name, m2.name
         FROM reservations r
         LEFT JOIN meals m1 ON r.meal_id = m1.id
         LEFT JOIN meals m2 ON r.dessert_id = m2.id
-        WHERE r.user_id = ? AND r.reservation_date >= date('now')
+        WHERE r.user_id = ? AND r.reservation_date >= ?
         ORDER BY r.reservation_date
-    ''', (user_id,))
-    
-    reservations = c.fetchall()
-    conn.close()
-    
-    if not reservations:
-        text = "شما هیچ رزروی ندارید."
-    else:
-        text = "📋 رزروهای شما:\n\n"
-        for date_str, meal_name, dessert_name in reservations:
-            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            day_name = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه'][date.weekday()]
-            dessert_text = dessert_name if dessert_name else "بدون دسر"
-            text += f"📅 {day_name} {date.strftime('%d/%m')}\n"
-            text += f"   🍽 {meal_name}\n"
-            text += f"   🍰 {dessert_text}\n\n"
-    
-    keyboard = [[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    ''', (user_id, booking_calendar.today.iso))
     
-    await query.edit_message_text(text, reply_markup=reply_markup)
+    await edit_if_changed(query, my_reservations_text(reservations), reply_markup=BACK_TO_MAIN)
 
 # مشاهده رزروها توسط ادمین
-async def admin_view_reservations(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def admin_view_reservations(update: Update, context: ContextTypes.DEFAULT_TYPE, forward: bool = True, cursor: tuple = None):
+    tenant = context.tenant
     query = update.callback_query
     await query.answer()
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
-    
-    c.execute('''
-        SELECT u.first_name, u.last_name, r.reservation_date, m1.name, m2.name
+    page = await fetch_page(
+        tenant.db,
+        '''
+        SELECT u.user_id, u.first_name, u.last_name, r.reservation_date, m1.name, m2.name
         FROM reservations r
         JOIN users u ON r.user_id = u.user_id
         LEFT JOIN meals m1 ON r.meal_id = m1.id
         LEFT JOIN meals m2 ON r.dessert_id = m2.id
-        WHERE r.reservation_date >= date('now')
-        ORDER BY r.reservation_date, u.first_name
-    ''')
+        WHERE r.reservation_date >= ? AND {keyset}
+        ORDER BY {order}
+        LIMIT ?
+        ''',
+        ('r.reservation_date', 'u.first_name', 'u.user_id'),
+        # اگر کاربر cursor حذف شده باشد از نام ذخیره شده در cursor استفاده می‌شود
+        "?, COALESCE((SELECT first_name FROM users WHERE user_id = ?), ?), ?",
+        (booking_calendar.today.iso,),
+        None if cursor is None else (cursor[0], cursor[1], cursor[2], cursor[1]),
+        forward,
+        RESERVATIONS_PAGE_SIZE
+    )
     
-    reservations = c.fetchall()
-    conn.close()
+    text = fit_page(page, reservations_text)
     
-    if not reservations:
-        text = "هیچ رزروی ثبت نشده است."
-    else:
-        text = "📊 رزروهای ثبت شده:\n\n"
-        current_date = None
-        for first_name, last_name, date_str, meal_name, dessert_name in reservations:
-            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            
-            if date != current_date:
-                day_name = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه'][date.weekday()]
-                text += f"\n📅 {day_name} {date.strftime('%d/%m/%Y')}:\n"
-                current_date = date
-            
-            dessert_text = dessert_name if dessert_name else "بدون دسر"
-            text += f"• {first_name} {last_name}: {meal_name} + {dessert_text}\n"
-    
-    keyboard = [[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_admin')]]
+    keyboard = []
+    nav = nav_buttons(
+        page, 'resv_page_', lambda row: cursor_with_name('resv_page_', f"{row[3]}_{row[0]}", row[1])
+    )
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([BACK_TO_ADMIN_BUTTON])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.edit_message_text(text, reply_markup=reply_markup)
+    await edit_if_changed(query, text, reply_markup=reply_markup)
+
+# ساخت و ارسال فایل اکسل
+# اگر از آخرین ساخت همین فایل داده‌ای تغییر نکرده باشد، بدون کوئری و openpyxl همان فایل
+# (با file_id تلگرام یا از حافظه) دوباره ارسال می‌شود
+async def send_workbook(update: Update, context: ContextTypes.DEFAULT_TYPE, kind: str, title: str,
+                        headers: list, dates: list, fetch, caption: str):
+    tenant = context.tenant
+    version = tenant.data_version.value
+    cached = tenant.export_cache.get(kind, dates[0])
+    
+    if cached is not None:
+        content, file_id = cached
+    else:
+        # دریافت داده‌ها با یک کوئری و ساخت فایل در پروسس جداگانه
+        rows = await fetch(tenant.db, dates)
+        content = await excel_export.render_workbook(title, headers, rows)
+        file_id = None
+    
+    filename = f"{kind}_{datetime.now(booking_calendar.tz).strftime('%Y%m%d_%H%M%S')}.xlsx"
+    message = await context.bot.send_document(
+        chat_id=update.effective_chat.id,
+        document=file_id or content,
+        filename=filename,
+        caption=caption
+    )
+    
+    if file_id is None:
+        tenant.export_cache.set(kind, dates[0], version, content, message.document.file_id if message.document else None)
 
 # خروجی اکسل
 async def export_to_excel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer("در حال تولید فایل اکسل...")
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
+    # سرستون‌ها
+    headers = ["نام", *booking_calendar.export_headers]
     
-    # ایجاد Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "برنامه غذایی"
+    await send_workbook(
+        update, context, 'food_schedule', "برنامه غذایی", headers, booking_calendar.dates,
+        excel_export.fetch_schedule, "📊 برنامه غذایی دو هفته آینده"
+    )
     
-    # تنظیمات استایل
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    center_alignment = Alignment(horizontal="center", vertical="center")
+    await query.message.reply_text("فایل اکسل ارسال شد.", reply_markup=BACK_TO_ADMIN)
+
+# خلاصه آشپزخانه: تعداد هر غذا و دسر در روزهای آینده
+# از جدول daily_meal_counts خوانده می‌شود و نیازی به شمارش رزروها نیست
+async def kitchen_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant = context.tenant
+    query = update.callback_query
+    await query.answer()
     
-    # سرستون‌ها
-    today = datetime.now().date()
-    headers = ["نام"]
-    dates = []
-    
-    for i in range(14):
-        date = today + timedelta(days=i)
-        day_name = ['شنبه', 'یکشنبه', 'دوشنبه', 'سه‌شنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه'][date.weekday()]
-        headers.append(f"{day_name}\n{date.strftime('%d/%m')}")
-        dates.append(date.strftime('%Y-%m-%d'))
-    
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = center_alignment
-    
-    # دریافت کاربران
-    c.execute("SELECT user_id, first_name, last_name FROM users WHERE is_active = 1 ORDER BY first_name")
-    users = c.fetchall()
-    
-    # پر کردن داده‌ها
-    for row, (user_id, first_name, last_name) in enumerate(users, 2):
-        ws.cell(row=row, column=1, value=f"{first_name} {last_name}").alignment = center_alignment
-        
-        for col, date_str in enumerate(dates, 2):
-            c.execute('''
-                SELECT m1.name, m2.name
-                FROM reservations r
-                LEFT JOIN meals m1 ON r.meal_id = m1.id
-                LEFT JOIN meals m2 ON r.dessert_id = m2.id
-                WHERE r.user_id = ? AND r.reservation_date = ?
-            ''', (user_id, date_str))
-            
-            result = c.fetchone()
-            if result:
-                meal_name, dessert_name = result
-                cell_value = meal_name
-                if dessert_name:
-                    cell_value += f"\n{dessert_name}"
-                ws.cell(row=row, column=col, value=cell_value).alignment = center_alignment
-    
-    # تنظیم عرض ستون‌ها
-    ws.column_dimensions['A'].width = 20
-    for col in range(2, len(headers) + 1):
-        ws.column_dimensions[ws.cell(row=1, column=col).column_letter].width = 15
-    
-    # ذخیره فایل
-    filename = f"food_schedule_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    wb.save(filename)
-    conn.close()
+    rows = await tenant.db.fetchall('''
+        SELECT c.reservation_date, m.type, m.name, c.count
+        FROM daily_meal_counts c
+        JOIN meals m ON m.id = c.item_id
+        WHERE c.reservation_date BETWEEN ? AND ? AND c.count > 0
+        ORDER BY c.reservation_date, m.type DESC, c.count DESC
+    ''', (booking_calendar.today.iso, booking_calendar.summary_end))
     
-    # ارسال فایل
-    with open(filename, 'rb') as file:
-        await context.bot.send_document(
-            chat_id=update.effective_chat.id,
-            document=file,
-            filename=filename,
-            caption="📊 برنامه غذایی دو هفته آینده"
-        )
+    await edit_if_changed(query, kitchen_summary_text(rows), reply_markup=KITCHEN_SUMMARY_MENU)
+
+# خروجی اکسل خلاصه آشپزخانه
+async def export_kitchen_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer("در حال تولید فایل اکسل...")
     
-    os.remove(filename)
+    headers = ["غذا / دسر", *booking_calendar.export_headers]
     
-    keyboard = [[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_admin')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.message.reply_text("فایل اکسل ارسال شد.", reply_markup=reply_markup)
+    await send_workbook(
+        update, context, 'kitchen_summary', "خلاصه آشپزخانه", headers, booking_calendar.dates,
+        excel_export.fetch_summary, "👨‍🍳 تعداد غذا و دسر هر روز در دو هفته آینده"
+    )
+    
+    await query.message.reply_text("فایل اکسل ارسال شد.", reply_markup=BACK_TO_ADMIN)
+
+# تاریخچه رزروها: تعداد رزرو هر روز در گذشته، از رزروهای فعلی و آرشیو شده
+async def reservation_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant = context.tenant
+    query = update.callback_query
+    await query.answer()
+    
+    rows = await tenant.db.fetchall('''
+        SELECT reservation_date, COUNT(*), COUNT(dessert_id)
+        FROM reservations_history
+        WHERE reservation_date BETWEEN ? AND ?
+        GROUP BY reservation_date
+        ORDER BY reservation_date DESC
+    ''', (booking_calendar.history_start, booking_calendar.yesterday))
+    
+    await edit_if_changed(query, history_text(rows, HISTORY_DAYS), reply_markup=BACK_TO_ADMIN)
 
 # ارسال پیام همگانی
 async def start_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+    
+    if not is_admin(update.effective_user.id):
+        await query.answer("شما دسترسی ندارید.", show_alert=True)
+        return ConversationHandler.END
+    
     await query.answer()
     
-    await query.edit_message_text(
+    await edit_if_changed(
+        query,
         "📢 پیام خود را برای ارسال به همه کاربران وارد کنید:\n\n"
         "برای لغو /cancel را ارسال کنید."
     )
@@ -701,33 +790,64 @@ async def start_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ارسال پیام به همه
 async def send_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant = context.tenant
+    if tenant is None:
+        return await deny_conversation(update)
     message = update.message.text
     
-    conn = sqlite3.connect('food_reservation.db')
-    c = conn.cursor()
-    c.execute("SELECT user_id FROM users WHERE is_active = 1")
-    users = c.fetchall()
-    conn.close()
-    
-    success_count = 0
-    fail_count = 0
+    users = await tenant.db.fetchall("SELECT user_id FROM users WHERE is_active = 1")
     
-    for (user_id,) in users:
-        try:
-            await context.bot.send_message(chat_id=user_id, text=f"📢 پیام از مدیریت:\n\n{message}")
-            success_count += 1
-        except Exception as e:
-            logger.error(f"Failed to send to {user_id}: {e}")
-            fail_count += 1
+    progress_message = await update.message.reply_text(
+        f"📢 در حال ارسال پیام به {len(users)} کاربر..."
+    )
     
-    await update.message.reply_text(
-        f"✅ پیام شما به {success_count} کاربر ارسال شد.\n"
-        f"❌ {fail_count} کاربر دریافت نکردند.\n\n"
-        "برای بازگشت به منو /start را ارسال کنید."
+    # ارسال در پس‌زمینه تا گفتگوی ادمین آزاد شود
+    broadcast = Broadcast(
+        context.bot,
+        [user_id for (user_id,) in users],
+        f"📢 پیام از مدیریت:\n\n{message}",
+        progress_message
     )
+    context.application.create_task(broadcast.run(), update=update)
     
     return ConversationHandler.END
 
+# برداشتن اعلان‌های اصلاح روز هفته در یک تراکنش؛ اگر دو ادمین هم‌زمان دستور را بفرستند فقط یکی آن‌ها را می‌گیرد
+def claim_weekday_notices(conn: sqlite3.Connection) -> list:
+    return conn.execute(
+        "DELETE FROM weekday_fix_notices RETURNING user_id, reservation_date"
+    ).fetchall()
+
+# اعلان یک‌باره به کاربرانی که رزرو آینده‌شان پیش از اصلاح نگاشت روز هفته ثبت شده است (مهاجرت 7)
+async def send_weekday_notices(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    tenant = context.tenant
+    if tenant is None or not is_admin(update.effective_user.id):
+        await update.message.reply_text("شما دسترسی ندارید.")
+        return
+    
+    rows = await tenant.db.run(claim_weekday_notices)
+    if not rows:
+        await update.message.reply_text("اعلانی برای ارسال وجود ندارد.")
+        return
+    
+    dates = {}
+    for user_id, date_str in sorted(rows, key=lambda row: row[1]):
+        dates.setdefault(user_id, []).append(day_info(date_str).label)
+    texts = {
+        user_id: "⚠️ نمایش روزهای هفته در ربات اصلاح شد.\n\n"
+                 "غذای رزرو شده شما برای این روزها از منوی روز دیگری انتخاب شده بود:\n"
+                 + "\n".join(f"• {label}" for label in labels) +
+                 "\n\nلطفاً رزرو این روزها را بررسی و در صورت نیاز دوباره ثبت کنید."
+        for user_id, labels in dates.items()
+    }
+    
+    progress_message = await update.message.reply_text(
+        f"📢 در حال ارسال اعلان {len(rows)} رزرو به {len(dates)} کاربر...\n"
+        "این رزروها حذف نشده‌اند."
+    )
+    broadcast = Broadcast(context.bot, list(texts), None, progress_message, texts=texts)
+    context.application.create_task(broadcast.run(), update=update)
+
 # لغو عملیات
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
@@ -736,121 +856,254 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return ConversationHandler.END
 
+# راه‌اندازی متریک‌ها و کارهای زمان‌بندی شده
+# هر سلف هنگام اولین استفاده باز می‌شود و کش‌هایش بارگذاری می‌شوند
+async def post_init(application: Application):
+    # متریک‌های لحظه‌ای و سرور /metrics
+    # update_queue بلافاصله تخلیه می‌شود؛ صف واقعی پشت قفل کاربران و جایگاه‌های هم‌زمانی است
+    registry.register(Gauge(
+        'mealbot_updates_pending', 'Updates waiting on a per-user lock or a concurrency slot.',
+        lambda: application.update_processor.pending
+    ))
+    registry.register(Gauge(
+        'mealbot_updates_in_flight', 'Updates currently being processed.',
+        lambda: application.update_processor.in_flight
+    ))
+    registry.register(Gauge(
+        'mealbot_auth_cache_hit_ratio', 'Authorization cache hit ratio.',
+        lambda: auth_cache_hit_ratio(tenant_manager.open_tenants())
+    ))
+    registry.register(Gauge(
+        'mealbot_open_tenants', 'Canteens with open database connections.',
+        lambda: len(tenant_manager.open_tenants())
+    ))
+    if METRICS_PORT:
+        await metrics.start_server(int(METRICS_PORT))
+    
+    # پروسس ساخت فایل‌های اکسل پیش از اولین درخواست خروجی بالا می‌آید
+    excel_export.start()
+    
+    # محاسبه دوباره بازه رزرو در نیمه‌شب و انتقال روزانه رزروهای قدیمی به آرشیو
+    if application.job_queue is not None:
+        booking_calendar.refresh()
+        application.job_queue.run_daily(
+            refresh_calendar, booking_calendar.midnight, name='refresh_calendar'
+        )
+        application.job_queue.run_repeating(
+            archive_reservations, interval=ARCHIVE_INTERVAL, first=60, name='archive_reservations'
+        )
+    else:
+        logger.warning("JobQueue is not available; the booking window will not move and past reservations will not be archived")
+
+def auth_cache_hit_ratio(tenants: list) -> float:
+    hits = sum(tenant.auth_cache.hits for tenant in tenants)
+    misses = sum(tenant.auth_cache.misses for tenant in tenants)
+    return hits / max(1, hits + misses)
+
+# بستن اتصال‌های دیتابیس هنگام خاموش شدن ربات
+async def shutdown(application: Application):
+    await metrics.stop_server()
+    excel_export.shutdown()
+    await tenant_manager.close()
+    db.close()
+
+# منوی اصلی کاربر
+async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    
+    await edit_if_changed(query, "منوی اصلی:", reply_markup=USER_MENU)
+
+# جدول مسیرهای دکمه‌ها
+router = CallbackRouter()
+
+# مسیرهای ادمین
+router.exact('back_to_admin', admin_menu, admin_only=True)
+router.exact('admin_users', admin_users_menu, admin_only=True)
+router.exact('admin_meals', admin_meals_menu, admin_only=True)
+router.exact('list_users', list_users, admin_only=True)
+router.prefix('users_page_', list_users, parse=parse_user_cursor, admin_only=True)
+router.exact('list_meals', list_meals, admin_only=True)
+router.exact('add_meal', select_day_for_meal, admin_only=True)
+router.exact('add_dessert', select_day_for_dessert, admin_only=True)
+router.exact('admin_view_reservations', admin_view_reservations, admin_only=True)
+router.prefix('resv_page_', admin_view_reservations, parse=parse_reservation_cursor, admin_only=True)
+router.exact('admin_export_excel', export_to_excel, admin_only=True)
+router.exact('kitchen_summary', kitchen_summary, admin_only=True)
+router.exact('kitchen_summary_excel', export_kitchen_summary, admin_only=True)
+router.exact('reservation_history', reservation_history, admin_only=True)
+
+# مسیرهای کاربران
+router.exact('back_to_main', main_menu)
+router.exact('reserve_food', reserve_food_menu)
+router.exact('my_reservations', my_reservations)
+router.prefix('rd:', select_meal_for_reservation, parse=reservation_parser(1), invalid=reject_invalid_reservation)
+router.prefix('rm:', select_dessert_for_reservation, parse=reservation_parser(2), invalid=reject_invalid_reservation)
+router.prefix('rs:', complete_reservation, parse=reservation_parser(3), invalid=reject_invalid_reservation)
+
 # هندلر callback query
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+    user_id = update.effective_user.id
     
-    if not is_admin(update.effective_user.id) and not is_authorized_user(update.effective_user.id):
-        await query.answer("شما دسترسی ندارید.", show_alert=True)
+    route, args = router.resolve(query.data)
+    if route is None:
+        await query.answer()
         return
     
-    data = query.data
-    
-    # مسیریابی
-    if data == 'back_to_admin':
-        await admin_menu(update, context)
-    elif data == 'back_to_main':
-        await query.answer()
-        keyboard = [
-            [InlineKeyboardButton("🍽 رزرو غذا", callback_data='reserve_food')],
-            [InlineKeyboardButton("📋 رزروهای من", callback_data='my_reservations')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("منوی اصلی:", reply_markup=reply_markup)
-    elif data == 'admin_users':
-        await admin_users_menu(update, context)
-    elif data == 'admin_meals':
-        await admin_meals_menu(update, context)
-    elif data == 'list_users':
-        await list_users(update, context)
-    elif data == 'list_meals':
-        await list_meals(update, context)
-    elif data == 'add_meal':
-        await select_day_for_meal(update, context)
-    elif data == 'add_dessert':
-        await select_day_for_dessert(update, context)
-    elif data.startswith('day_meal_'):
-        await receive_meal_day(update, context)
-    elif data.startswith('day_dessert_'):
-        await receive_meal_day(update, context)
-    elif data == 'admin_view_reservations':
-        await admin_view_reservations(update, context)
-    elif data == 'admin_export_excel':
-        await export_to_excel(update, context)
-    elif data == 'reserve_food':
-        await reserve_food_menu(update, context)
-    elif data.startswith('reserve_'):
-        await select_meal_for_reservation(update, context)
-    elif data.startswith('meal_'):
-        await select_dessert_for_reservation(update, context)
-    elif data.startswith('dessert_'):
-        await complete_reservation(update, context)
-    elif data == 'my_reservations':
-        await my_reservations(update, context)
-
-def main():
-    # دریافت توکن از متغیر محیطی
-    TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-    PORT = int(os.getenv('PORT', 8443))
+    # بررسی دسترسی
+    if route.admin_only:
+        allowed = is_admin(user_id)
+    else:
+        allowed = is_admin(user_id) or await is_authorized_user(user_id)
     
-    if not TOKEN:
-        logger.error("TELEGRAM_BOT_TOKEN not found!")
+    if not allowed:
+        await query.answer("شما دسترسی ندارید.", show_alert=True)
         return
     
-    # ایجاد دیتابیس
-    init_db()
-    
-    # ایجاد Application
-    application = Application.builder().token(TOKEN).build()
+    await router.dispatch(route, args, update, context)
+
+# ایجاد Application و ثبت هندلرها
+def build_application(builder) -> Application:
+    application = (
+        builder
+        .context_types(ContextTypes(context=TenantContext))
+        .concurrent_updates(TenantUpdateProcessor(tenant_manager, MAX_CONCURRENT_UPDATES))
+        .persistence(SQLitePersistence(db))
+        .post_init(post_init)
+        .post_shutdown(shutdown)
+        .build()
+    )
     
     # ConversationHandler برای افزودن کاربر
     add_user_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(start_add_user, pattern='^add_user$')],
+        entry_points=[CallbackQueryHandler(timed(start_add_user), pattern='^add_user$')],
         states={
-            ADD_USER_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_user_id)],
-            ADD_USER_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_user_name)],
+            ADD_USER_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed(receive_user_id))],
+            ADD_USER_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed(receive_user_name))],
         },
-        fallbacks=[CommandHandler('cancel', cancel)],
+        fallbacks=[CommandHandler('cancel', timed(cancel))],
+        name='add_user',
+        persistent=True,
+    )
+    
+    # ConversationHandler برای افزودن گروهی کاربران
+    import_users_handler = ConversationHandler(
+        entry_points=[CallbackQueryHandler(timed(start_import_users), pattern='^import_users$')],
+        states={
+            IMPORT_USERS: [MessageHandler(filters.Document.ALL, timed(receive_users_file))],
+        },
+        fallbacks=[CommandHandler('cancel', timed(cancel))],
+        name='import_users',
+        persistent=True,
     )
     
     # ConversationHandler برای افزودن غذا
     add_meal_handler = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(receive_meal_day, pattern='^day_meal_'),
-            CallbackQueryHandler(receive_meal_day, pattern='^day_dessert_')
+            CallbackQueryHandler(timed(receive_meal_day), pattern='^day_meal_'),
+            CallbackQueryHandler(timed(receive_meal_day), pattern='^day_dessert_')
         ],
         states={
-            ADD_MEAL: [MessageHandler(filters.TEXT & ~filters.COMMAND, save_meal)],
-            ADD_DESSERT: [MessageHandler(filters.TEXT & ~filters.COMMAND, save_meal)],
+            ADD_MEAL: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed(save_meal))],
+            ADD_DESSERT: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed(save_meal))],
+        },
+        fallbacks=[CommandHandler('cancel', timed(cancel))],
+        name='add_meal',
+        persistent=True,
+    )
+    
+    # ConversationHandler برای بارگذاری منوی هفتگی
+    import_menu_handler = ConversationHandler(
+        entry_points=[CallbackQueryHandler(timed(start_import_menu), pattern='^import_menu$')],
+        states={
+            IMPORT_MENU: [MessageHandler(filters.Document.ALL, timed(receive_menu_file))],
         },
-        fallbacks=[CommandHandler('cancel', cancel)],
+        fallbacks=[CommandHandler('cancel', timed(cancel))],
+        name='import_menu',
+        persistent=True,
     )
     
     # ConversationHandler برای پیام همگانی
     broadcast_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(start_broadcast, pattern='^admin_broadcast$')],
+        entry_points=[CallbackQueryHandler(timed(start_broadcast), pattern='^admin_broadcast$')],
         states={
-            BROADCAST_MSG: [MessageHandler(filters.TEXT & ~filters.COMMAND, send_broadcast)],
+            BROADCAST_MSG: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed(send_broadcast))],
         },
-        fallbacks=[CommandHandler('cancel', cancel)],
+        fallbacks=[CommandHandler('cancel', timed(cancel))],
+        name='broadcast',
+        persistent=True,
     )
     
     # اضافه کردن handlers
-    application.add_handler(CommandHandler("start", start))
+    # دکمه‌های تکراری و کاربران پرتکرار پیش از همه هندلرها (از جمله مکالمه‌ها) کنار گذاشته می‌شوند
+    application.add_handler(CallbackQueryHandler(admit_callback), group=-1)
+    application.add_handler(CommandHandler("start", timed(start)))
+    application.add_handler(CommandHandler("weekday_notices", timed(send_weekday_notices)))
     application.add_handler(add_user_handler)
+    application.add_handler(import_users_handler)
     application.add_handler(add_meal_handler)
+    application.add_handler(import_menu_handler)
     application.add_handler(broadcast_handler)
     application.add_handler(CallbackQueryHandler(button_handler))
     
+    return application
+
+def main():
+    # دریافت توکن از متغیر محیطی
+    TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+    PORT = int(os.getenv('PORT', 8443))
+    # آدرس Bot API؛ برای اجرای محلی با یک سرور جایگزین قابل تغییر است
+    API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+    WORKER_PORT = os.getenv('WEBHOOK_WORKER_PORT')
+    # آدرس عمومی webhook (بدون مسیر)؛ روی Railway از دامنه عمومی ساخته می‌شود
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+    if not WEBHOOK_URL and os.getenv('RAILWAY_PUBLIC_DOMAIN'):
+        WEBHOOK_URL = f"https://{os.getenv('RAILWAY_PUBLIC_DOMAIN')}"
+    
+    if not TOKEN:
+        logger.error("TELEGRAM_BOT_TOKEN not found!")
+        return
+    
+    # حالت webhook چند پروسسی: این پروسس فقط آپدیت‌ها را بین workerها تقسیم می‌کند
+    if WEBHOOK_WORKERS > 1 and not WORKER_PORT:
+        if not WEBHOOK_URL:
+            logger.error("WEBHOOK_WORKERS > 1 requires WEBHOOK_URL (or RAILWAY_PUBLIC_DOMAIN)")
+            return
+        if not WEBHOOK_SECRET:
+            logger.error("WEBHOOK_WORKERS > 1 requires WEBHOOK_SECRET")
+            return
+        # مهاجرت‌ها یک بار و پیش از شروع workerها اجرا می‌شوند
+        init_db()
+        asyncio.run(run_front(
+            TOKEN, PORT, f"{WEBHOOK_URL}/{TOKEN}", TOKEN, f"{API_URL}/bot"
+        ))
+        return
+    
+    # ایجاد دیتابیس
+    init_db()
+    
+    # ایجاد Application
+    application = build_application(
+        Application.builder()
+        .token(TOKEN)
+        .base_url(f"{API_URL}/bot")
+        .base_file_url(f"{API_URL}/file/bot")
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .get_updates_request(InstrumentedRequest())
+    )
+    
     # راه‌اندازی
-    if os.getenv('RAILWAY_ENVIRONMENT'):
-        # حالت webhook برای Railway
-        WEBHOOK_URL = os.getenv('RAILWAY_PUBLIC_DOMAIN')
+    if WORKER_PORT:
+        # worker حالت چند پروسسی: آپدیت‌ها از پروسس جلویی می‌رسند
+        asyncio.run(run_worker(application, int(WORKER_PORT)))
+    elif WEBHOOK_URL:
+        # حالت webhook (مثلاً روی Railway)
         application.run_webhook(
             listen="0.0.0.0",
             port=PORT,
             url_path=TOKEN,
-            webhook_url=f"https://{WEBHOOK_URL}/{TOKEN}"
+            webhook_url=f"{WEBHOOK_URL}/{TOKEN}"
         )
     else:
         # حالت polling برای تست محلی
@@ -0,0 +1,140 @@
+import re
+import sqlite3
+from keyboards import WEEKDAYS
+from user_import import cell_text, iter_rows
+
+MAX_MEAL_NAME_LENGTH = 100
+
+# نام ستون‌های قابل قبول در سطر عنوان
+COLUMN_NAMES = {
+    'meal': 'meal', 'meals': 'meal', 'غذا': 'meal', 'غذاها': 'meal',
+    'dessert': 'dessert', 'desserts': 'dessert', 'دسر': 'dessert', 'دسرها': 'dessert',
+}
+
+# جداکننده چند غذا در یک خانه
+ITEM_SEPARATOR = re.compile(r'[\n،,]+')
+
+
+def _normalize_day(value: str) -> str:
+    return value.replace('‌', '').replace(' ', '')
+
+
+_DAY_INDEX = {_normalize_day(day): i for i, day in enumerate(WEEKDAYS)}
+
+
+def parse_day(value: str):
+    if value.isdigit() and int(value) < len(WEEKDAYS):
+        return int(value)
+    return _DAY_INDEX.get(_normalize_day(value))
+
+
+class MenuImportResult:
+    def __init__(self):
+        self.added = 0
+        self.removed = 0
+        # غذاهایی که در فایل نیستند ولی رزرو آینده دارند؛ از منو کنار گذاشته شدند ولی حذف نشدند
+        self.kept = 0
+        # [(شماره سطر، دلیل)]
+        self.rejected = []
+
+
+# خواندن جدول روز هفته × (غذا، دسر)؛ خروجی مجموعه (day_of_week, type, name)
+# اولین سطر غیرخالی اگر روز نباشد سطر عنوان است و باید ستون غذا یا دسر را معرفی کند
+def read_menu(rows, result: MenuImportResult) -> set:
+    columns = {'meal': 1, 'dessert': 2}
+    items = set()
+    first = True
+
+    for line, row in enumerate(rows, 1):
+        cells = [cell_text(value) for value in row]
+        if not any(cells):
+            continue
+
+        day = parse_day(cells[0])
+        if day is None:
+            if not first:
+                result.rejected.append((line, f"روز نامعتبر: {cells[0]}"))
+                continue
+            # سطر عنوان
+            header = {COLUMN_NAMES.get(cell.lower()): i for i, cell in enumerate(cells)}
+            header.pop(None, None)
+            if not header:
+                raise ValueError(f"سطر عنوان شناخته نشد (سطر {line}): ستون غذا یا دسر پیدا نشد")
+            columns = header
+            first = False
+            continue
+        first = False
+
+        for meal_type, column in columns.items():
+            if column >= len(cells):
+                continue
+            for name in ITEM_SEPARATOR.split(cells[column]):
+                name = name.strip()
+                if not name:
+                    continue
+                if len(name) > MAX_MEAL_NAME_LENGTH:
+                    result.rejected.append((line, "نام غذا بیش از حد طولانی است"))
+                else:
+                    items.add((day, meal_type, name))
+
+    return items
+
+
+# جایگزینی یا ادغام منوی هفتگی در یک تراکنش (در ترد دیتابیس اجرا می‌شود)
+# در حالت جایگزینی، غذاهایی که در فایل نیستند حذف می‌شوند و غذاهای تکراری شناسه خود را حفظ می‌کنند؛
+# غذاهایی که رزرو از امروز (today) به بعد دارند به جای حذف retired می‌شوند تا از منو بیرون بروند
+# ولی رزروها نام غذای خود را از دست ندهند. غذای retired که دوباره در فایل بیاید به منو برمی‌گردد.
+# فایلی که هیچ غذای معتبری ندارد منو را جایگزین نمی‌کند.
+def import_menu(conn: sqlite3.Connection, content: bytes, filename: str, replace: bool,
+                today: str) -> MenuImportResult:
+    result = MenuImportResult()
+    items = read_menu(iter_rows(content, filename), result)
+    if not items:
+        raise ValueError("هیچ غذای معتبری در فایل پیدا نشد؛ منو تغییر نکرد")
+
+    existing = {}
+    retired = set()
+    for meal_id, day, meal_type, name, is_retired in conn.execute(
+        "SELECT id, day_of_week, type, name, retired FROM meals"
+    ):
+        existing.setdefault((day, meal_type, name), []).append(meal_id)
+        if is_retired:
+            retired.add(meal_id)
+
+    if replace:
+        reserved = {
+            item_id for (item_id,) in conn.execute(
+                '''SELECT meal_id FROM reservations WHERE reservation_date >= ?
+                   UNION SELECT dessert_id FROM reservations
+                   WHERE reservation_date >= ? AND dessert_id IS NOT NULL''',
+                (today, today)
+            )
+        }
+        stale = [
+            meal_id
+            for key, meal_ids in existing.items() if key not in items
+            for meal_id in meal_ids
+        ]
+        removed = [(meal_id,) for meal_id in stale if meal_id not in reserved]
+        kept = [(meal_id,) for meal_id in stale if meal_id in reserved]
+        conn.executemany("DELETE FROM meals WHERE id = ?", removed)
+        conn.executemany("UPDATE meals SET retired = 1 WHERE id = ?", kept)
+        result.removed = len(removed)
+        result.kept = len(kept)
+
+    restored = [
+        (meal_id,)
+        for key in items if key in existing
+        for meal_id in existing[key] if meal_id in retired
+    ]
+    conn.executemany("UPDATE meals SET retired = 0 WHERE id = ?", restored)
+
+    added = sorted(item for item in items if item not in existing)
+    conn.executemany(
+        "INSERT INTO meals (day_of_week, type, name) VALUES (?, ?, ?)",
+        added
+    )
+    # غذاهای برگشته به منو هم اضافه شده حساب می‌شوند
+    result.added = len(added) + len(restored)
+
+    return result
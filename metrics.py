@@ -0,0 +1,216 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from functools import wraps
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# پورت سرور متریک‌ها؛ اگر تنظیم نشود سرور اجرا نمی‌شود
+METRICS_PORT = os.getenv('METRICS_PORT')
+
+_server = None
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+# مقدار لحظه‌ای که هنگام خواندن متریک‌ها از تابع callback گرفته می‌شود
+class Gauge:
+    def __init__(self, name: str, documentation: str, callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self.callback is not None:
+            try:
+                lines.append(f"{self.name} {float(self.callback())}")
+            except Exception as e:
+                logger.warning(f"Failed to read gauge {self.name}: {e}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    bucket_labels = _labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+                bucket_labels = _labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HANDLER_LATENCY = registry.register(Histogram(
+    'mealbot_handler_duration_seconds', 'Time spent in update handlers.', ('handler',)
+))
+HANDLER_ERRORS = registry.register(Counter(
+    'mealbot_handler_errors_total', 'Exceptions raised by update handlers.', ('handler',)
+))
+DB_QUERY_LATENCY = registry.register(Histogram(
+    'mealbot_db_query_duration_seconds', 'SQLite query duration.', ('query',)
+))
+BOT_API_LATENCY = registry.register(Histogram(
+    'mealbot_bot_api_duration_seconds', 'Telegram Bot API request duration.', ('method',)
+))
+BOT_API_ERRORS = registry.register(Counter(
+    'mealbot_bot_api_errors_total', 'Failed Telegram Bot API requests.', ('method', 'reason')
+))
+EDITS_SKIPPED = registry.register(Counter(
+    'mealbot_edits_skipped_total', 'Message edits skipped because the content did not change.'
+))
+CALLBACKS_REJECTED = registry.register(Counter(
+    'mealbot_callbacks_rejected_total', 'Callback queries dropped before reaching a handler.', ('reason',)
+))
+CACHE_REQUESTS = registry.register(Counter(
+    'mealbot_cache_requests_total', 'Cache lookups by cache and result (hit or miss).', ('cache', 'result')
+))
+
+
+# زمان‌سنجی یک هندلر؛ name برای برچسب متریک است
+def timed(handler, name: str = None):
+    name = name or handler.__name__
+
+    @wraps(handler)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, handler=name)
+
+    return wrapper
+
+
+# لایه HTTP ربات با ثبت زمان و خطای هر فراخوانی Bot API
+class InstrumentedRequest(HTTPXRequest):
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs):
+        endpoint = url.rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+        except Exception as e:
+            BOT_API_ERRORS.inc(method=endpoint, reason=type(e).__name__)
+            raise
+        finally:
+            BOT_API_LATENCY.observe(time.perf_counter() - start, method=endpoint)
+        if code >= 400:
+            BOT_API_ERRORS.inc(method=endpoint, reason=str(code))
+        return code, payload
+
+
+async def _handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[1] == b'/metrics':
+            status, body = '200 OK', registry.render().encode()
+        else:
+            status, body = '404 Not Found', b'not found\n'
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+# سرور HTTP ساده برای /metrics روی یک پورت جداگانه
+async def start_server(port: int, host: str = '0.0.0.0'):
+    global _server
+    _server = await asyncio.start_server(_handle_request, host, port)
+    logger.info(f"Metrics available on http://{host}:{port}/metrics")
+
+
+async def stop_server():
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
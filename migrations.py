@@ -0,0 +1,189 @@
+import logging
+import sqlite3
+from booking_calendar import booking_calendar
+
+logger = logging.getLogger(__name__)
+
+
+# رزروهای آینده (از امروز به وقت سلف) که از منوی روز اشتباه انتخاب شده‌اند؛
+# منوی هر تاریخ قبلاً با date.weekday() (دوشنبه = 0) از جدول meals (شنبه = 0) خوانده می‌شد
+def _record_weekday_notices(conn: sqlite3.Connection):
+    conn.execute(
+        '''INSERT OR IGNORE INTO weekday_fix_notices (user_id, reservation_date)
+           SELECT r.user_id, r.reservation_date
+           FROM reservations r
+           JOIN meals m ON m.id = r.meal_id
+           WHERE r.reservation_date >= ?
+             AND m.day_of_week != (CAST(strftime('%w', r.reservation_date) AS INTEGER) + 1) % 7''',
+        (booking_calendar.today.iso,)
+    )
+
+# مهاجرت‌های ساختار دیتابیس به ترتیب نسخه
+# نسخه فعلی در PRAGMA user_version ذخیره می‌شود؛ هرگز مهاجرت قبلی را تغییر ندهید
+# هر مرحله یک دستور SQL است یا تابعی که اتصال را می‌گیرد (برای مراحلی که پارامتر لازم دارند)
+MIGRATIONS = [
+    # 1: جدول‌های اولیه
+    [
+        '''CREATE TABLE IF NOT EXISTS users
+           (user_id INTEGER PRIMARY KEY,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            is_active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS meals
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            day_of_week INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS reservations
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            meal_id INTEGER,
+            dessert_id INTEGER,
+            reservation_date DATE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (meal_id) REFERENCES meals (id),
+            FOREIGN KEY (dessert_id) REFERENCES meals (id),
+            UNIQUE(user_id, reservation_date))''',
+        '''CREATE TABLE IF NOT EXISTS settings
+           (key TEXT PRIMARY KEY,
+            value TEXT NOT NULL)''',
+    ],
+    # 2: ایندکس‌ها برای کوئری‌های بر اساس تاریخ و منوی روزانه
+    [
+        '''CREATE INDEX IF NOT EXISTS idx_reservations_date_user
+           ON reservations (reservation_date, user_id, meal_id, dessert_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_meals_day_type
+           ON meals (day_of_week, type, id, name)''',
+        '''CREATE INDEX IF NOT EXISTS idx_users_active_name
+           ON users (is_active, first_name, last_name)''',
+    ],
+    # 3: ذخیره user_data و وضعیت مکالمه‌ها بین راه‌اندازی‌های ربات
+    [
+        '''CREATE TABLE IF NOT EXISTS user_data
+           (user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL)''',
+        '''CREATE TABLE IF NOT EXISTS conversations
+           (name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state INTEGER NOT NULL,
+            PRIMARY KEY (name, key))''',
+    ],
+    # 4: تعداد رزرو هر غذا و دسر در هر تاریخ برای خلاصه آشپزخانه
+    # با تریگرهای جدول reservations به‌روز نگه داشته می‌شود
+    [
+        '''CREATE TABLE IF NOT EXISTS daily_meal_counts
+           (reservation_date DATE NOT NULL,
+            item_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (reservation_date, item_id)) WITHOUT ROWID''',
+        '''INSERT INTO daily_meal_counts (reservation_date, item_id, count)
+           SELECT reservation_date, item_id, COUNT(*)
+           FROM (SELECT reservation_date, meal_id AS item_id FROM reservations WHERE meal_id IS NOT NULL
+                 UNION ALL
+                 SELECT reservation_date, dessert_id FROM reservations WHERE dessert_id IS NOT NULL)
+           GROUP BY reservation_date, item_id''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_reservations_count_insert
+           AFTER INSERT ON reservations
+           BEGIN
+               INSERT INTO daily_meal_counts (reservation_date, item_id, count)
+               SELECT NEW.reservation_date, item_id, 1
+               FROM (SELECT NEW.meal_id AS item_id UNION ALL SELECT NEW.dessert_id)
+               WHERE item_id IS NOT NULL
+               ON CONFLICT (reservation_date, item_id) DO UPDATE SET count = count + 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_reservations_count_delete
+           AFTER DELETE ON reservations
+           BEGIN
+               UPDATE daily_meal_counts SET count = count - 1
+               WHERE reservation_date = OLD.reservation_date AND item_id IN (OLD.meal_id, OLD.dessert_id);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_reservations_count_update
+           AFTER UPDATE OF meal_id, dessert_id, reservation_date ON reservations
+           BEGIN
+               UPDATE daily_meal_counts SET count = count - 1
+               WHERE reservation_date = OLD.reservation_date AND item_id IN (OLD.meal_id, OLD.dessert_id);
+               INSERT INTO daily_meal_counts (reservation_date, item_id, count)
+               SELECT NEW.reservation_date, item_id, 1
+               FROM (SELECT NEW.meal_id AS item_id UNION ALL SELECT NEW.dessert_id)
+               WHERE item_id IS NOT NULL
+               ON CONFLICT (reservation_date, item_id) DO UPDATE SET count = count + 1;
+           END''',
+    ],
+    # 5: آرشیو رزروهای گذشته؛ گزارش‌های تاریخچه از view روی هر دو جدول می‌خوانند
+    [
+        '''CREATE TABLE IF NOT EXISTS reservations_archive
+           (id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            meal_id INTEGER,
+            dessert_id INTEGER,
+            reservation_date DATE NOT NULL,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE INDEX IF NOT EXISTS idx_reservations_archive_date_user
+           ON reservations_archive (reservation_date, user_id, meal_id, dessert_id)''',
+        '''CREATE VIEW IF NOT EXISTS reservations_history AS
+           SELECT id, user_id, meal_id, dessert_id, reservation_date, created_at FROM reservations
+           UNION ALL
+           SELECT id, user_id, meal_id, dessert_id, reservation_date, created_at FROM reservations_archive''',
+    ],
+    # 6: نگاشت کاربران به سلف (فقط در دیتابیس اصلی استفاده می‌شود)
+    [
+        '''CREATE TABLE IF NOT EXISTS user_tenants
+           (user_id INTEGER PRIMARY KEY,
+            tenant TEXT NOT NULL)''',
+    ],
+    # 7: کاربرانی که رزرو آینده‌شان پیش از اصلاح نگاشت روز هفته ثبت شده؛
+    # ادمین سلف با /weekday_notices یک بار به آن‌ها اطلاع می‌دهد
+    [
+        '''CREATE TABLE IF NOT EXISTS weekday_fix_notices
+           (user_id INTEGER NOT NULL,
+            reservation_date DATE NOT NULL,
+            PRIMARY KEY (user_id, reservation_date)) WITHOUT ROWID''',
+        _record_weekday_notices,
+    ],
+    # 8: غذاهای کنار گذاشته شده از منو که هنوز رزرو دارند؛ در منو نمایش داده نمی‌شوند
+    # ولی برای نام غذای رزروها و خروجی‌ها باقی می‌مانند
+    [
+        "ALTER TABLE meals ADD COLUMN retired INTEGER NOT NULL DEFAULT 0",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+# اجرای مهاجرت‌هایی که هنوز روی دیتابیس اعمال نشده‌اند
+def migrate(conn: sqlite3.Connection):
+    conn.execute("PRAGMA journal_mode = WAL")
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than this bot ({SCHEMA_VERSION})"
+        )
+
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for number, statements in enumerate(MIGRATIONS[version:], version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # پروسس دیگری ممکن است هم‌زمان همین مهاجرت را اعمال کرده باشد
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                    conn.execute("COMMIT")
+                    continue
+                for statement in statements:
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            logger.info(f"Database migrated to schema version {number}")
+    finally:
+        conn.isolation_level = isolation_level
@@ -0,0 +1,116 @@
+from datetime import date
+from telegram import InlineKeyboardButton
+
+# تعداد سطرهای هر صفحه؛ اگر متن صفحه از MAX_MESSAGE_LENGTH بیشتر شود سطرهای کمتری نمایش داده می‌شود
+USERS_PAGE_SIZE = 30
+RESERVATIONS_PAGE_SIZE = 25
+
+# حداکثر طول پیام تلگرام (بر حسب واحدهای UTF-16)
+MAX_MESSAGE_LENGTH = 4096
+
+# حداکثر طول callback_data (بایت)
+MAX_CALLBACK_DATA = 64
+
+# بزرگ‌ترین کاراکتر؛ کران بالای همه نام‌هایی که با یک پیشوند شروع می‌شوند
+_MAX_CHAR = '\U0010ffff'
+
+
+class Page:
+    __slots__ = ('rows', 'has_prev', 'has_next', 'forward')
+
+    def __init__(self, rows: list, has_prev: bool, has_next: bool, forward: bool = True):
+        self.rows = rows
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.forward = forward
+
+
+# دریافت یک صفحه با keyset pagination
+# query باید شامل شرط {keyset} در WHERE و {order} باشد و به LIMIT ? ختم شود.
+# cursor_expr عبارتی با همان ستون‌های columns است که از cursor_params مقدار می‌گیرد؛
+# اگر cursor_params برابر None باشد صفحه اول برگردانده می‌شود.
+async def fetch_page(db, query: str, columns: tuple, cursor_expr: str, params: tuple,
+                     cursor_params, forward: bool, page_size: int) -> Page:
+    if cursor_params is None:
+        keyset = "1"
+        cursor_params = ()
+    else:
+        keyset = f"({', '.join(columns)}) {'>' if forward else '<'} ({cursor_expr})"
+    order = ", ".join(column if forward else f"{column} DESC" for column in columns)
+
+    rows = await db.fetchall(
+        query.format(keyset=keyset, order=order),
+        (*params, *cursor_params, page_size + 1)
+    )
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if forward:
+        return Page(rows, has_prev=bool(cursor_params), has_next=has_more)
+    rows.reverse()
+    return Page(rows, has_prev=has_more, has_next=True, forward=False)
+
+
+def message_length(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+
+# متن صفحه با render(rows)؛ تا وقتی متن در یک پیام جا نشود سطرهای دورتر از cursor کنار گذاشته می‌شوند
+# و در صفحه بعدی (یا قبلی) می‌آیند
+def fit_page(page: Page, render) -> str:
+    text = render(page.rows)
+    while message_length(text) > MAX_MESSAGE_LENGTH and len(page.rows) > 1:
+        if page.forward:
+            page.rows.pop()
+            page.has_next = True
+        else:
+            page.rows.pop(0)
+            page.has_prev = True
+        text = render(page.rows)
+    return text
+
+
+# ردیف دکمه‌های قبلی/بعدی؛ cursor_of(row) شناسه سطر را برای callback_data می‌سازد
+def nav_buttons(page: Page, prefix: str, cursor_of) -> list:
+    buttons = []
+    if page.has_prev and page.rows:
+        buttons.append(InlineKeyboardButton("◀️ قبلی", callback_data=f"{prefix}p_{cursor_of(page.rows[0])}"))
+    if page.has_next and page.rows:
+        buttons.append(InlineKeyboardButton("بعدی ▶️", callback_data=f"{prefix}n_{cursor_of(page.rows[-1])}"))
+    return buttons
+
+
+# شناسه cursor به همراه ابتدای نام (تا جایی که callback_data از MAX_CALLBACK_DATA بیشتر نشود)؛
+# نام فقط وقتی استفاده می‌شود که کاربر cursor دیگر وجود نداشته باشد
+def cursor_with_name(prefix: str, key: str, name: str) -> str:
+    budget = MAX_CALLBACK_DATA - len(f"{prefix}n_{key}_".encode())
+    name = name.encode()[:max(budget, 0)].decode(errors='ignore')
+    return f"{key}_{name}"
+
+
+def _direction(payload: str):
+    direction, _, rest = payload.partition('_')
+    if direction not in ('n', 'p'):
+        raise ValueError(payload)
+    return direction == 'n', rest
+
+
+# ابتدای نام ذخیره شده در cursor به کرانی تبدیل می‌شود که در هیچ جهتی سطری را جا نیندازد
+# (در بدترین حالت چند سطر تکرار می‌شوند)
+def _name_bound(name: str, forward: bool) -> str:
+    return name if forward else name + _MAX_CHAR
+
+
+# payload: n_<user_id>_<name> یا p_<user_id>_<name> -> (forward, (user_id, نام))
+def parse_user_cursor(payload: str) -> tuple:
+    forward, rest = _direction(payload)
+    user_id, _, name = rest.partition('_')
+    return forward, (int(user_id), _name_bound(name, forward))
+
+
+# payload: n_<reservation_date>_<user_id>_<name> -> (forward, (reservation_date, user_id, نام))
+def parse_reservation_cursor(payload: str) -> tuple:
+    forward, rest = _direction(payload)
+    date_str, _, rest = rest.partition('_')
+    user_id, _, name = rest.partition('_')
+    return forward, (date.fromisoformat(date_str).isoformat(), int(user_id), _name_bound(name, forward))
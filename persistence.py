@@ -0,0 +1,130 @@
+import os
+import json
+import asyncio
+import logging
+import sqlite3
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# فاصله ذخیره تغییرات user_data و وضعیت مکالمه‌ها (ثانیه)
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', 2))
+
+
+def write_state(conn: sqlite3.Connection, users: dict, conversations: dict):
+    conn.executemany(
+        "INSERT INTO user_data (user_id, data) VALUES (?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
+        [(user_id, data) for user_id, data in users.items() if data is not None]
+    )
+    conn.executemany(
+        "DELETE FROM user_data WHERE user_id = ?",
+        [(user_id,) for user_id, data in users.items() if data is None]
+    )
+    conn.executemany(
+        "INSERT INTO conversations (name, key, state) VALUES (?, ?, ?) "
+        "ON CONFLICT(name, key) DO UPDATE SET state = excluded.state",
+        [(name, key, state) for (name, key), state in conversations.items() if state is not None]
+    )
+    conn.executemany(
+        "DELETE FROM conversations WHERE name = ? AND key = ?",
+        [key for key, state in conversations.items() if state is None]
+    )
+
+
+# ذخیره user_data و وضعیت ConversationHandlerها در دیتابیس
+# تغییرات در حافظه جمع می‌شوند و همه با هم در یک تراکنش نوشته می‌شوند؛
+# Application هر PERSISTENCE_INTERVAL ثانیه فقط کاربرانی را که تغییر کرده‌اند می‌فرستد.
+# chat_data و bot_data استفاده نمی‌شوند و ذخیره نمی‌شوند.
+class SQLitePersistence(BasePersistence):
+    def __init__(self, database, update_interval: float = PERSISTENCE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db = database
+        # user_id -> JSON یا None برای حذف
+        self._users = {}
+        # (name, key) -> state یا None برای حذف
+        self._conversations = {}
+        self._task = None
+        self._write_lock = asyncio.Lock()
+
+    def _schedule(self):
+        # تغییراتی که در یک دور به‌روزرسانی می‌رسند در یک تراکنش نوشته می‌شوند
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._write())
+
+    async def _write(self):
+        # اجازه بده بقیه‌ی update_*های همین دور هم به صف برسند
+        await asyncio.sleep(0)
+        self._task = None
+        users, self._users = self._users, {}
+        conversations, self._conversations = self._conversations, {}
+        if not users and not conversations:
+            return
+
+        async with self._write_lock:
+            try:
+                await self.db.run(write_state, users, conversations)
+            except Exception as e:
+                logger.error(f"Failed to persist state: {e}")
+                # در دور بعد دوباره تلاش می‌شود؛ مقدارهای جدیدتر اولویت دارند
+                self._users = {**users, **self._users}
+                self._conversations = {**conversations, **self._conversations}
+
+    async def get_user_data(self) -> dict:
+        rows = await self.db.fetchall("SELECT user_id, data FROM user_data")
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = await self.db.fetchall("SELECT key, state FROM conversations WHERE name = ?", (name,))
+        return {tuple(json.loads(key)): state for key, state in rows}
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        self._conversations[(name, json.dumps(key))] = new_state
+        self._schedule()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._users[user_id] = json.dumps(data, ensure_ascii=False) if data else None
+        self._schedule()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._users[user_id] = None
+        self._schedule()
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    # هنگام خاموش شدن ربات همه‌ی تغییرات باقی‌مانده نوشته می‌شوند
+    async def flush(self) -> None:
+        if self._task is not None:
+            await self._task
+        await self._write()
@@ -0,0 +1,165 @@
+import os
+import logging
+from collections import OrderedDict
+from telegram.error import BadRequest
+from keyboards import WEEKDAYS
+from booking_calendar import day_info
+from metrics import EDITS_SKIPPED
+
+logger = logging.getLogger(__name__)
+
+# حداکثر تعداد پیام‌هایی که هش آخرین محتوایشان نگه‌داری می‌شود
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', 10000))
+
+NO_DESSERT = "بدون دسر"
+
+# حداکثر طول نام‌ها (کاربر، غذا) در لیست‌های صفحه‌بندی شده؛ یک سطر به تنهایی از حد پیام بیشتر نمی‌شود
+MAX_FIELD_LENGTH = 64
+
+# قالب‌های سطرها؛ متد format یک بار گرفته می‌شود و برای هر سطر فقط فراخوانی می‌شود
+_USER_LINE = "• {} {} ({}) - {}".format
+_MENU_DAY = "📅 {}:".format
+_MENU_MEALS = "  🍽 غذاها: {}".format
+_MENU_DESSERTS = "  🍰 دسرها: {}".format
+_MY_RESERVATION = "📅 {}\n   🍽 {}\n   🍰 {}\n".format
+_DAY_HEADER = "\n📅 {}:".format
+_RESERVATION_LINE = "• {} {}: {} + {}".format
+_SUMMARY_LINE = "   {} {}: {}".format
+_HISTORY_LINE = "📅 {}: 🍽 {}  🍰 {}".format
+
+_STATUS = {True: "✅ فعال", False: "❌ غیرفعال"}
+_ICONS = {'meal': "🍽", 'dessert': "🍰"}
+
+
+def _clip(value: str) -> str:
+    return value if len(value) <= MAX_FIELD_LENGTH else value[:MAX_FIELD_LENGTH - 1] + "…"
+
+
+def users_text(rows: list) -> str:
+    if not rows:
+        return "هیچ کاربری ثبت نشده است."
+    lines = ["📋 لیست کاربران:\n"]
+    lines.extend(
+        _USER_LINE(_clip(first_name), _clip(last_name), user_id, _STATUS[bool(is_active)])
+        for user_id, first_name, last_name, is_active in rows
+    )
+    return '\n'.join(lines)
+
+
+def meals_text(menu_cache) -> str:
+    lines = ["📋 لیست غذاها و دسرها:\n"]
+    for i, day in enumerate(WEEKDAYS):
+        lines.append(_MENU_DAY(day))
+        meals = menu_cache.items(i, 'meal')
+        if meals:
+            lines.append(_MENU_MEALS(", ".join(name for _, name in meals)))
+        desserts = menu_cache.items(i, 'dessert')
+        if desserts:
+            lines.append(_MENU_DESSERTS(", ".join(name for _, name in desserts)))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def my_reservations_text(rows: list) -> str:
+    if not rows:
+        return "شما هیچ رزروی ندارید."
+    lines = ["📋 رزروهای شما:\n"]
+    lines.extend(
+        _MY_RESERVATION(day_info(date_str).label, meal_name, dessert_name or NO_DESSERT)
+        for date_str, meal_name, dessert_name in rows
+    )
+    return '\n'.join(lines)
+
+
+# رزروهای ثبت شده؛ سطرها بر اساس تاریخ مرتب هستند و برای هر روز یک سرتیتر می‌آید
+def reservations_text(rows: list) -> str:
+    if not rows:
+        return "هیچ رزروی ثبت نشده است."
+    lines = ["📊 رزروهای ثبت شده:\n"]
+    current_date = None
+    for user_id, first_name, last_name, date_str, meal_name, dessert_name in rows:
+        if date_str != current_date:
+            lines.append(_DAY_HEADER(day_info(date_str).full_label))
+            current_date = date_str
+        lines.append(_RESERVATION_LINE(
+            _clip(first_name), _clip(last_name), _clip(meal_name or ''), _clip(dessert_name or NO_DESSERT)
+        ))
+    return '\n'.join(lines)
+
+
+def kitchen_summary_text(rows: list) -> str:
+    if not rows:
+        return "هیچ رزروی برای روزهای آینده ثبت نشده است."
+    lines = ["👨‍🍳 خلاصه آشپزخانه:"]
+    current_date = None
+    for date_str, meal_type, name, count in rows:
+        if date_str != current_date:
+            lines.append(_DAY_HEADER(day_info(date_str).full_label))
+            current_date = date_str
+        lines.append(_SUMMARY_LINE(_ICONS.get(meal_type, "🍰"), name, count))
+    return '\n'.join(lines)
+
+
+def history_text(rows: list, days: int) -> str:
+    if not rows:
+        return "هیچ رزروی در روزهای گذشته ثبت نشده است."
+    lines = [f"🗂 تاریخچه رزروهای {days} روز گذشته:\n"]
+    lines.extend(
+        _HISTORY_LINE(day_info(date_str).full_label, meals, desserts)
+        for date_str, meals, desserts in rows
+    )
+    return '\n'.join(lines)
+
+
+# هش آخرین محتوای هر پیام (LRU)؛ ویرایشی که همان متن و دکمه‌ها را دوباره بفرستد
+# بدون درخواست به تلگرام رد می‌شود. همه ویرایش‌های پیام‌های ربات باید از edit_if_changed
+# بگذرند تا هش با محتوای واقعی پیام یکی بماند.
+class RenderCache:
+    def __init__(self, max_size: int = RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self._hashes = OrderedDict()
+
+    def unchanged(self, key, content_hash: int) -> bool:
+        if self._hashes.get(key) != content_hash:
+            return False
+        self._hashes.move_to_end(key)
+        return True
+
+    def set(self, key, content_hash: int):
+        self._hashes[key] = content_hash
+        self._hashes.move_to_end(key)
+        while len(self._hashes) > self.max_size:
+            self._hashes.popitem(last=False)
+
+    def invalidate(self, key):
+        self._hashes.pop(key, None)
+
+
+render_cache = RenderCache()
+
+
+# شناسه پیامی که دکمه‌اش زده شده
+def message_key(query):
+    if query.message is not None:
+        return query.message.chat_id, query.message.message_id
+    return query.inline_message_id
+
+
+# ویرایش پیام دکمه فقط اگر محتوا تغییر کرده باشد
+async def edit_if_changed(query, text: str, reply_markup=None):
+    key = message_key(query)
+    # هش InlineKeyboardMarkup از متن و داده دکمه‌ها ساخته می‌شود
+    content_hash = hash((text, reply_markup))
+    if render_cache.unchanged(key, content_hash):
+        EDITS_SKIPPED.inc()
+        return
+
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        # پیام همین محتوا را دارد (مثلاً پس از راه‌اندازی دوباره ربات)
+        if 'message is not modified' not in e.message.lower():
+            render_cache.invalidate(key)
+            raise
+        EDITS_SKIPPED.inc()
+    render_cache.set(key, content_hash)
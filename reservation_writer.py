@@ -0,0 +1,89 @@
+import os
+import asyncio
+import sqlite3
+
+# حداکثر زمان انتظار برای جمع شدن رزروها در یک تراکنش (میلی‌ثانیه)
+GROUP_COMMIT_MS = float(os.getenv('GROUP_COMMIT_MS', 5))
+
+# اگر تعداد رزروهای در انتظار به این عدد برسد بلافاصله نوشته می‌شوند
+GROUP_COMMIT_MAX = int(os.getenv('GROUP_COMMIT_MAX', 100))
+
+
+# UPSERT به جای INSERT OR REPLACE تا تریگر به‌روزرسانی daily_meal_counts اجرا شود
+# (REPLACE تریگر حذف را اجرا نمی‌کند)
+def write_reservations(conn: sqlite3.Connection, rows: list):
+    conn.executemany(
+        "INSERT INTO reservations (user_id, meal_id, dessert_id, reservation_date) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(user_id, reservation_date) DO UPDATE SET "
+        "meal_id = excluded.meal_id, dessert_id = excluded.dessert_id, created_at = CURRENT_TIMESTAMP",
+        rows
+    )
+
+
+# صف نوشتن رزروها با group commit
+# رزروهای هم‌زمان در یک تراکنش نوشته می‌شوند (هر چند میلی‌ثانیه یا هر N رزرو).
+# چند رزرو برای یک (user_id, reservation_date) در یک دسته به آخرین مقدار خلاصه می‌شوند.
+# await روی reserve فقط پس از commit شدن تراکنش برمی‌گردد.
+class ReservationWriter:
+    def __init__(self, database, version, delay_ms: float = GROUP_COMMIT_MS, max_batch: int = GROUP_COMMIT_MAX):
+        self.db = database
+        # DataVersion که پس از هر commit افزایش می‌یابد
+        self.version = version
+        self.delay = delay_ms / 1000
+        self.max_batch = max_batch
+        # (user_id, reservation_date) -> [row, [futures]]
+        self._pending = {}
+        self._timer = None
+        self._tasks = set()
+        # دسته‌ها به ترتیب نوشته می‌شوند تا مقدار جدیدتر روی مقدار قدیمی‌تر ننشیند
+        self._write_lock = asyncio.Lock()
+
+    async def reserve(self, user_id: int, meal_id: int, dessert_id, reservation_date: str):
+        future = asyncio.get_running_loop().create_future()
+        row = (user_id, meal_id, dessert_id, reservation_date)
+
+        entry = self._pending.get((user_id, reservation_date))
+        if entry is None:
+            self._pending[(user_id, reservation_date)] = [row, [future]]
+        else:
+            entry[0] = row
+            entry[1].append(future)
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.delay, self._flush)
+
+        await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, batch: dict):
+        async with self._write_lock:
+            try:
+                await self.db.run(write_reservations, [row for row, _ in batch.values()])
+            except Exception as e:
+                for _, futures in batch.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+            else:
+                self.version.bump()
+                for _, futures in batch.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(None)
+
+    # نوشتن رزروهای باقی‌مانده هنگام خاموش شدن ربات
+    async def close(self):
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
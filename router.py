@@ -0,0 +1,84 @@
+import time
+import logging
+from datetime import date
+from metrics import HANDLER_LATENCY, HANDLER_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+# تبدیل‌کننده payload دکمه‌های رزرو به آرگومان‌های نوع‌دار:
+# '<ordinal تاریخ>:<id>:<id>...' -> (date, id, id, ...) با دقیقاً fields بخش
+def reservation_parser(fields: int):
+    def parse(payload: str) -> tuple:
+        parts = payload.split(':')
+        if len(parts) != fields:
+            raise ValueError(payload)
+        day, *ids = parts
+        return (date.fromordinal(int(day)), *(int(item_id) for item_id in ids))
+    return parse
+
+
+class Route:
+    __slots__ = ('name', 'handler', 'parse', 'admin_only', 'invalid')
+
+    def __init__(self, name: str, handler, parse=None, admin_only: bool = False, invalid=None):
+        self.name = name
+        self.handler = handler
+        self.parse = parse
+        self.admin_only = admin_only
+        # مسیری که payload نامعتبر به آن فرستاده می‌شود
+        self.invalid = invalid
+
+
+# مسیریاب callback_data: ابتدا تطابق دقیق با دیکشنری، سپس جدول پیشوندها (طولانی‌ترین پیشوند اول)
+# payload پس از پیشوند یک بار parse شده و به صورت آرگومان به هندلر داده می‌شود
+class CallbackRouter:
+    def __init__(self):
+        self._exact = {}
+        self._prefixes = []
+        # آمار هر مسیر: name -> [تعداد، مجموع زمان، بیشترین زمان]
+        self.stats = {}
+
+    def exact(self, data: str, handler, admin_only: bool = False):
+        self._exact[data] = Route(data, handler, admin_only=admin_only)
+
+    # invalid: هندلری (بدون آرگومان) برای payloadی که parse نمی‌شود؛ در غیر این صورت دکمه نادیده گرفته می‌شود
+    def prefix(self, prefix: str, handler, parse=None, admin_only: bool = False, invalid=None):
+        if invalid is not None:
+            invalid = Route(prefix + '* (invalid)', invalid, admin_only=admin_only)
+        self._prefixes.append((prefix, Route(prefix + '*', handler, parse, admin_only, invalid)))
+        self._prefixes.sort(key=lambda item: len(item[0]), reverse=True)
+
+    # یافتن مسیر و آرگومان‌های آن؛ برای داده ناشناخته یا نامعتبر (None, ()) برمی‌گردد
+    def resolve(self, data: str):
+        route = self._exact.get(data)
+        if route is not None:
+            return route, ()
+
+        for prefix, route in self._prefixes:
+            if data.startswith(prefix):
+                if route.parse is None:
+                    return route, ()
+                try:
+                    return route, route.parse(data[len(prefix):])
+                except (ValueError, OverflowError):
+                    logger.warning(f"Invalid callback data: {data!r}")
+                    return route.invalid, ()
+
+        return None, ()
+
+    async def dispatch(self, route: Route, args: tuple, update, context):
+        start = time.perf_counter()
+        try:
+            return await route.handler(update, context, *args)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=route.name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            HANDLER_LATENCY.observe(elapsed, handler=route.name)
+            stats = self.stats.setdefault(route.name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            logger.debug(f"Route {route.name} handled in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,281 @@
+import os
+import json
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from telegram.ext import CallbackContext
+from database import DB_PATH, Database, db
+from migrations import migrate
+from cache import AuthCache, ExportCache, MenuCache, data_version_for
+from reservation_writer import ReservationWriter
+from update_processor import PerUserUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# آیدی ادمین در حالت تک‌سلفی (بدون TENANTS_CONFIG)
+ADMIN_ID = int(os.getenv('ADMIN_ID', 166152961))
+
+# فایل JSON تعریف سلف‌ها؛ اگر تنظیم نشود یک سلف با DATABASE_PATH و ADMIN_ID ساخته می‌شود
+# {"canteens": [{"name": "north", "database": "north.db", "admins": [123]}, ...]}
+TENANTS_CONFIG = os.getenv('TENANTS_CONFIG')
+
+# حداکثر تعداد سلف‌هایی که هم‌زمان اتصال باز دارند
+MAX_OPEN_TENANTS = int(os.getenv('MAX_OPEN_TENANTS', 16))
+
+# سلف آپدیتی که در حال پردازش است
+_current_tenant = ContextVar('current_tenant', default=None)
+
+
+def current_tenant():
+    return _current_tenant.get()
+
+
+class TenantConfig:
+    def __init__(self, name: str, database: str, admins):
+        self.name = name
+        self.database = database
+        self.admins = frozenset(admins)
+
+
+def load_configs() -> dict:
+    if not TENANTS_CONFIG:
+        return {'default': TenantConfig('default', DB_PATH, [ADMIN_ID])}
+
+    with open(TENANTS_CONFIG, encoding='utf-8') as f:
+        canteens = json.load(f)['canteens']
+    return {
+        canteen['name']: TenantConfig(canteen['name'], canteen['database'], canteen.get('admins', []))
+        for canteen in canteens
+    }
+
+
+# یک سلف: دیتابیس جداگانه و کش‌ها و صف نوشتن مخصوص خودش
+class Tenant:
+    def __init__(self, config: TenantConfig):
+        self.name = config.name
+        self.admins = config.admins
+        self.db = Database(config.database)
+        self.auth_cache = AuthCache()
+        self.menu_cache = MenuCache()
+        self.data_version = data_version_for(config.database)
+        self.export_cache = ExportCache(self.data_version)
+        self.reservation_writer = ReservationWriter(self.db, self.data_version)
+        # تعداد آپدیت‌ها و کارهایی که در حال استفاده از این سلف هستند
+        self.users = 0
+        # نسخه‌هایی از users و meals که کش‌ها با آن‌ها ساخته شده‌اند
+        self._users_seen = None
+        self._meals_seen = None
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self.admins
+
+    async def is_authorized(self, user_id: int) -> bool:
+        authorized = self.auth_cache.get(user_id)
+        if authorized is not None:
+            return authorized
+
+        result = await self.db.fetchone("SELECT is_active FROM users WHERE user_id = ?", (user_id,))
+        authorized = result is not None and result[0] == 1
+        self.auth_cache.set(user_id, authorized)
+        return authorized
+
+    # به‌روز کردن کش‌ها اگر جدول users یا meals (در هر پروسسی) تغییر کرده باشد؛
+    # از کش دسترسی فقط کاربران تغییر کرده حذف می‌شوند و تنها در صورت نامعلوم بودن آن‌ها کل کش بارگذاری می‌شود
+    async def sync(self):
+        users, meals = self.data_version.users, self.data_version.meals
+        if users != self._users_seen:
+            changed = None
+            if self._users_seen is not None:
+                changed = self.data_version.changed_users(self._users_seen, users)
+            self._users_seen = users
+            if changed is None:
+                await self.auth_cache.load(self.db)
+            else:
+                for user_id in changed:
+                    self.auth_cache.invalidate(user_id)
+        if meals != self._meals_seen:
+            self._meals_seen = meals
+            await self.menu_cache.refresh(self.db)
+
+    async def open(self):
+        await self.db.run(migrate)
+        await self.sync()
+
+    async def close(self):
+        await self.reservation_writer.close()
+        await asyncio.get_running_loop().run_in_executor(None, self.db.close)
+        self.data_version.close()
+
+
+# مدیریت سلف‌ها: نگاشت کاربر به سلف و نگه‌داری LRU محدودی از سلف‌های باز
+# نگاشت کاربران در جدول user_tenants دیتابیس اصلی (DATABASE_PATH) ذخیره می‌شود؛
+# ادمین‌ها از فایل تنظیمات و در حالت تک‌سلفی همه کاربران به تنها سلف نگاشت می‌شوند.
+# سلفی که در حال استفاده است هرگز بسته نمی‌شود؛ ممکن است موقتاً بیش از MAX_OPEN_TENANTS سلف باز بمانند.
+class TenantManager:
+    def __init__(self, directory: Database, max_open: int = MAX_OPEN_TENANTS):
+        self.directory = directory
+        self.max_open = max_open
+        self.configs = load_configs()
+        self.admins = {
+            user_id: config.name
+            for config in self.configs.values()
+            for user_id in config.admins
+        }
+        # user_id -> نام سلف ('' برای کاربر ناشناس)
+        self._users = AuthCache()
+        # با هر تغییر نگاشت (در هر پروسسی) users آن افزایش می‌یابد و کش نگاشت خالی می‌شود
+        self.version = data_version_for(directory.path)
+        self._users_seen = self.version.users
+        self._open = OrderedDict()
+        self._opening = {}
+        # تعداد آپدیت‌هایی که منتظر باز شدن هر سلف هستند
+        self._waiting = {}
+
+    @property
+    def single(self) -> bool:
+        return len(self.configs) == 1
+
+    def open_tenants(self) -> list:
+        return list(self._open.values())
+
+    async def tenant_name(self, user_id: int):
+        if user_id in self.admins:
+            return self.admins[user_id]
+        if self.single:
+            return next(iter(self.configs))
+
+        users = self.version.users
+        if users != self._users_seen:
+            changed = self.version.changed_users(self._users_seen, users)
+            self._users_seen = users
+            if changed is None:
+                self._users.invalidate()
+            else:
+                for changed_id in changed:
+                    self._users.invalidate(changed_id)
+
+        name = self._users.get(user_id)
+        if name is None:
+            row = await self.directory.fetchone(
+                "SELECT tenant FROM user_tenants WHERE user_id = ?", (user_id,)
+            )
+            name = row[0] if row is not None and row[0] in self.configs else ''
+            self._users.set(user_id, name)
+        return name or None
+
+    # ثبت کاربران یک سلف در جدول نگاشت
+    async def assign(self, user_ids, name: str):
+        if self.single:
+            return
+        user_ids = list(user_ids)
+        await self.directory.executemany(
+            "INSERT INTO user_tenants (user_id, tenant) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET tenant = excluded.tenant",
+            [(user_id, name) for user_id in user_ids]
+        )
+        for user_id in user_ids:
+            self._users.set(user_id, name)
+        self.version.bump(users=True, user_ids=user_ids)
+
+    # گرفتن سلف و افزایش users آن؛ سلف برگردانده شده تا کم شدن users بسته نمی‌شود
+    async def _acquire(self, name: str) -> Tenant:
+        tenant = self._open.get(name)
+        if tenant is not None:
+            self._open.move_to_end(name)
+            tenant.users += 1
+            return tenant
+
+        # چند آپدیت هم‌زمان برای یک سلف بسته فقط یک بار آن را باز می‌کنند؛
+        # users سلف تازه باز شده همان لحظه به تعداد منتظرها افزایش می‌یابد تا پیش از
+        # برگشتن آن‌ها با باز شدن سلف دیگری بسته نشود
+        opening = self._opening.get(name)
+        if opening is None:
+            opening = self._opening[name] = asyncio.ensure_future(self._open_tenant(name))
+        self._waiting[name] = self._waiting.get(name, 0) + 1
+        try:
+            return await asyncio.shield(opening)
+        except asyncio.CancelledError:
+            if not opening.done():
+                self._waiting[name] -= 1
+            elif not opening.cancelled() and opening.exception() is None:
+                opening.result().users -= 1
+            raise
+
+    async def _open_tenant(self, name: str) -> Tenant:
+        tenant = Tenant(self.configs[name])
+        try:
+            await tenant.open()
+        except BaseException:
+            self._opening.pop(name, None)
+            self._waiting.pop(name, None)
+            raise
+        tenant.users += self._waiting.pop(name, 0)
+        self._opening.pop(name, None)
+        self._open[name] = tenant
+        logger.info(f"Opened tenant {name}")
+        await self._evict()
+        return tenant
+
+    # بستن قدیمی‌ترین سلف‌های بیکار تا تعداد سلف‌های باز به max_open برسد
+    # هر سلف پیش از await از _open برداشته می‌شود تا در حین بسته شدن دوباره گرفته نشود
+    async def _evict(self):
+        while len(self._open) > self.max_open:
+            name = next((name for name, tenant in self._open.items() if tenant.users == 0), None)
+            if name is None:
+                return
+            tenant = self._open.pop(name)
+            await tenant.close()
+            logger.info(f"Closed idle tenant {name}")
+
+    # استفاده از یک سلف تا پایان بلوک؛ در این مدت بسته نمی‌شود
+    @asynccontextmanager
+    async def use(self, name: str):
+        tenant = await self._acquire(name)
+        token = _current_tenant.set(tenant)
+        try:
+            await tenant.sync()
+            yield tenant
+        finally:
+            _current_tenant.reset(token)
+            tenant.users -= 1
+            # سلف‌هایی که هنگام باز شدن سلف دیگری در حال استفاده بودند حالا بسته می‌شوند
+            if tenant.users == 0 and len(self._open) > self.max_open:
+                await self._evict()
+
+    @asynccontextmanager
+    async def use_for_user(self, user_id):
+        name = None if user_id is None else await self.tenant_name(user_id)
+        if name is None:
+            yield None
+            return
+        async with self.use(name) as tenant:
+            yield tenant
+
+    async def close(self):
+        while self._open:
+            _, tenant = self._open.popitem()
+            await tenant.close()
+        self.version.close()
+
+
+tenant_manager = TenantManager(db)
+
+
+# context.tenant سلف کاربری است که آپدیت را فرستاده (None برای کاربر ناشناس)
+class TenantContext(CallbackContext):
+    @property
+    def tenant(self):
+        return current_tenant()
+
+
+# پردازش هر آپدیت در حالی که سلف کاربر باز و در context در دسترس است
+class TenantUpdateProcessor(PerUserUpdateProcessor):
+    def __init__(self, manager: TenantManager, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self.manager = manager
+
+    async def do_process_update(self, update: object, coroutine):
+        async with self.manager.use_for_user(self._key(update)):
+            await coroutine
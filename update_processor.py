@@ -0,0 +1,86 @@
+import os
+import time
+import asyncio
+from contextvars import ContextVar
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# حداکثر تعداد آپدیت‌هایی که هم‌زمان پردازش می‌شوند
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', 32))
+
+# زمان رسیدن آپدیتی که در حال پردازش است (پیش از انتظار پشت آپدیت‌های قبلی همان کاربر)
+_arrived_at = ContextVar('update_arrived_at', default=None)
+
+
+def update_arrival_time() -> float:
+    arrived_at = _arrived_at.get()
+    return time.monotonic() if arrived_at is None else arrived_at
+
+
+# پردازش هم‌زمان آپدیت‌ها، با حفظ ترتیب آپدیت‌های هر کاربر
+# آپدیت‌های یک کاربر پشت یک قفل صف می‌شوند تا ConversationHandler و user_data
+# هرگز هم‌زمان برای یک کاربر تغییر نکنند؛ کاربران مختلف موازی پردازش می‌شوند.
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        # key -> [قفل، تعداد آپدیت‌های در انتظار]
+        self._locks = {}
+        # آپدیت‌هایی که پشت قفل کاربر یا جایگاه هم‌زمانی منتظرند و آپدیت‌هایی که در حال پردازش هستند
+        self.pending = 0
+        self.in_flight = 0
+
+    @staticmethod
+    def _key(update: object):
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                return update.effective_user.id
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+        return None
+
+    # قفل کاربر قبل از گرفتن جایگاه هم‌زمانی گرفته می‌شود تا آپدیت‌های منتظر یک کاربر
+    # جایگاه کاربران دیگر را اشغال نکنند
+    async def process_update(self, update: object, coroutine):
+        _arrived_at.set(time.monotonic())
+        self.pending += 1
+        started = False
+
+        async def run():
+            nonlocal started
+            started = True
+            self.pending -= 1
+            self.in_flight += 1
+            try:
+                await coroutine
+            finally:
+                self.in_flight -= 1
+
+        try:
+            key = self._key(update)
+            if key is None:
+                await super().process_update(update, run())
+                return
+
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    await super().process_update(update, run())
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+        finally:
+            if not started:
+                self.pending -= 1
+
+    async def do_process_update(self, update: object, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
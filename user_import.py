@@ -0,0 +1,131 @@
+import io
+import csv
+import sqlite3
+from itertools import islice
+from openpyxl import load_workbook
+
+# حداکثر حجم فایل ورودی (بایت)
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+
+# تعداد سطرهای هر دسته executemany
+IMPORT_BATCH_SIZE = 500
+
+MAX_NAME_LENGTH = 64
+
+# نام ستون‌های قابل قبول در سطر عنوان
+COLUMN_NAMES = {
+    'user_id': 'user_id', 'id': 'user_id', 'آیدی': 'user_id', 'شناسه': 'user_id',
+    'first_name': 'first_name', 'نام': 'first_name',
+    'last_name': 'last_name', 'نام خانوادگی': 'last_name',
+}
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        # آیدی همه کاربران درج یا به‌روزرسانی شده (هر آیدی یک بار، حتی اگر در چند سطر فایل آمده باشد)
+        self.user_ids = []
+        # [(شماره سطر، دلیل)]
+        self.rejected = []
+
+
+# خواندن سطرهای فایل به صورت جریانی؛ XLSX در حالت read-only خوانده می‌شود
+def iter_rows(content: bytes, filename: str):
+    if filename.lower().endswith('.xlsx'):
+        wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        try:
+            yield from wb.active.iter_rows(values_only=True)
+        finally:
+            wb.close()
+    else:
+        text = io.TextIOWrapper(io.BytesIO(content), encoding='utf-8-sig', newline='')
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(text, dialect)
+
+
+# BOM (مثلاً در سطری که فقط BOM دارد) جزو محتوای خانه حساب نمی‌شود
+def cell_text(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).replace('\ufeff', '').strip()
+
+
+# اعتبارسنجی سطرها؛ سطرهای معتبر به صورت (user_id, first_name, last_name) برگردانده می‌شوند
+# اولین سطر غیرخالی اگر با آیدی شروع نشود سطر عنوان است
+def iter_users(rows, result: ImportResult):
+    columns = {'user_id': 0, 'first_name': 1, 'last_name': 2}
+    first = True
+
+    for line, row in enumerate(rows, 1):
+        cells = [cell_text(value) for value in row]
+        if not any(cells):
+            continue
+
+        # سطر عنوان
+        is_first, first = first, False
+        if is_first and not cells[0].lstrip('-').isdigit():
+            header = {COLUMN_NAMES.get(cell.lower()): i for i, cell in enumerate(cells)}
+            header.pop(None, None)
+            if set(header) == set(columns):
+                columns = header
+            continue
+
+        try:
+            user_id = int(cells[columns['user_id']])
+            first_name = cells[columns['first_name']]
+            last_name = cells[columns['last_name']]
+        except (IndexError, ValueError):
+            result.rejected.append((line, "آیدی نامعتبر یا ستون ناقص"))
+            continue
+
+        if user_id <= 0:
+            result.rejected.append((line, "آیدی نامعتبر"))
+        elif not first_name or not last_name:
+            result.rejected.append((line, "نام یا نام خانوادگی خالی است"))
+        elif len(first_name) > MAX_NAME_LENGTH or len(last_name) > MAX_NAME_LENGTH:
+            result.rejected.append((line, "نام بیش از حد طولانی است"))
+        else:
+            yield user_id, first_name, last_name
+
+
+# درج یا به‌روزرسانی کاربران در یک تراکنش (در ترد دیتابیس اجرا می‌شود)
+def import_users(conn: sqlite3.Connection, content: bytes, filename: str) -> ImportResult:
+    result = ImportResult()
+    users = iter_users(iter_rows(content, filename), result)
+    # آیدی‌هایی که در دسته‌های قبلی شمرده شده‌اند
+    seen = set()
+
+    while True:
+        # آخرین سطر هر آیدی در دسته معتبر است
+        batch = dict((row[0], row) for row in islice(users, IMPORT_BATCH_SIZE))
+        if not batch:
+            break
+
+        placeholders = ','.join('?' * len(batch))
+        existing = {
+            user_id for (user_id,) in conn.execute(
+                f"SELECT user_id FROM users WHERE user_id IN ({placeholders})", tuple(batch)
+            )
+        }
+
+        conn.executemany(
+            "INSERT INTO users (user_id, first_name, last_name) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET "
+            "first_name = excluded.first_name, last_name = excluded.last_name",
+            batch.values()
+        )
+        new_ids = [user_id for user_id in batch if user_id not in seen]
+        seen.update(new_ids)
+        result.user_ids.extend(new_ids)
+        result.updated += sum(1 for user_id in new_ids if user_id in existing)
+        result.inserted += sum(1 for user_id in new_ids if user_id not in existing)
+
+    return result
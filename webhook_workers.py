@@ -0,0 +1,288 @@
+import os
+import sys
+import json
+import signal
+import asyncio
+import logging
+import subprocess
+import httpx
+from telegram import Bot, Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+# تعداد پروسس‌های worker در حالت webhook
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 1))
+
+# worker شماره i روی پورت WORKER_BASE_PORT + i (فقط روی 127.0.0.1) گوش می‌دهد
+WORKER_BASE_PORT = int(os.getenv('WORKER_BASE_PORT', 8600))
+
+# مقدار هدر X-Telegram-Bot-Api-Secret-Token که در setWebhook ثبت می‌شود (در حالت چند worker الزامی است)
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+
+# حداکثر حجم بدنه درخواست‌های webhook (بایت)؛ آپدیت‌های تلگرام بسیار کوچک‌تر هستند
+MAX_REQUEST_BYTES = int(os.getenv('MAX_REQUEST_BYTES', 1024 * 1024))
+
+# حداکثر تعداد آپدیت‌هایی که در یک درخواست به worker فرستاده می‌شوند
+FORWARD_BATCH_SIZE = 100
+
+# حداکثر آپدیت‌های در صف هر worker؛ اگر پر شود پاسخ به تلگرام تا خالی شدن صف منتظر می‌ماند
+FORWARD_QUEUE_SIZE = 10000
+
+WORKER_PATH = '/updates'
+
+
+# درخواستی که خوانده نمی‌شود؛ پاسخ status فرستاده و اتصال بسته می‌شود
+class RequestError(Exception):
+    def __init__(self, status: str):
+        super().__init__(status)
+        self.status = status
+
+
+# خواندن یک درخواست HTTP/1.1؛ در پایان اتصال None برگردانده می‌شود
+# بدنه بزرگ‌تر از max_body بدون خواندن رد می‌شود
+async def read_request(reader: asyncio.StreamReader, max_body: int):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    parts = request_line.decode('latin-1').split()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise RequestError('400 Bad Request')
+    if len(parts) < 2 or length < 0:
+        raise RequestError('400 Bad Request')
+    if length > max_body:
+        raise RequestError('413 Payload Too Large')
+
+    body = await reader.readexactly(length)
+    return parts[0], parts[1], headers, body
+
+
+def write_response(writer: asyncio.StreamWriter, status: str, body: bytes = b''):
+    writer.write(
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+
+
+async def serve_requests(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, handle,
+                         max_body: int = MAX_REQUEST_BYTES):
+    try:
+        while True:
+            try:
+                request = await read_request(reader, max_body)
+            except RequestError as e:
+                write_response(writer, e.status)
+                await writer.drain()
+                break
+            if request is None:
+                break
+            # handle وضعیت پاسخ یا (وضعیت، بدنه) را برمی‌گرداند
+            try:
+                result = await handle(*request)
+            except ValueError:
+                result = '400 Bad Request'
+            status, body = result if isinstance(result, tuple) else (result, b'')
+            write_response(writer, status, body)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+# کلید شارد هر آپدیت مثل PerUserUpdateProcessor: کاربر، در غیر این صورت چت
+def shard_key(data: dict) -> int:
+    for field, value in data.items():
+        if field == 'update_id' or not isinstance(value, dict):
+            continue
+        user = value.get('from') or value.get('user')
+        if user:
+            return user['id']
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+    return data.get('update_id', 0)
+
+
+# ارسال آپدیت‌های یک worker به ترتیب ورود؛ هر بار همه آپدیت‌های در صف (تا FORWARD_BATCH_SIZE)
+# در یک درخواست فرستاده می‌شوند و تا تحویل موفق دوباره تلاش می‌شود
+class Forwarder:
+    def __init__(self, client: httpx.AsyncClient, port: int):
+        self.client = client
+        self.url = f"http://127.0.0.1:{port}{WORKER_PATH}"
+        self.queue = asyncio.Queue(FORWARD_QUEUE_SIZE)
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < FORWARD_BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            content = b'[' + b','.join(batch) + b']'
+            delay = 0.1
+            while True:
+                try:
+                    response = await self.client.post(self.url, content=content)
+                    if response.status_code == 200:
+                        break
+                    if response.status_code < 500:
+                        logger.error(f"Worker {self.url} rejected {len(batch)} updates ({response.status_code})")
+                        break
+                    logger.warning(f"Worker {self.url} answered {response.status_code}")
+                except httpx.HTTPError as e:
+                    logger.warning(f"Worker {self.url} unavailable: {e!r}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 2.0)
+
+            for _ in batch:
+                self.queue.task_done()
+
+    async def stop(self, timeout: float = 10):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.queue.qsize()} updates for {self.url}")
+        self.task.cancel()
+
+
+# اجرای یک پروسس worker و راه‌اندازی دوباره آن در صورت خروج ناگهانی
+class WorkerProcess:
+    def __init__(self, index: int, env: dict):
+        self.index = index
+        self.env = env
+        self.process = None
+        self.stopping = False
+
+    def spawn(self):
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'meal_bot.py')
+        self.process = subprocess.Popen([sys.executable, script], env=self.env)
+        logger.info(f"Started worker {self.index} (pid {self.process.pid})")
+
+    async def watch(self):
+        while not self.stopping:
+            code = await asyncio.get_running_loop().run_in_executor(None, self.process.wait)
+            if self.stopping:
+                return
+            logger.error(f"Worker {self.index} exited with code {code}; restarting")
+            await asyncio.sleep(1)
+            self.spawn()
+
+    def terminate(self):
+        self.stopping = True
+        if self.process.poll() is None:
+            self.process.terminate()
+
+
+def _stop_event() -> asyncio.Event:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+
+# پروسس جلویی: دریافت webhook تلگرام و تقسیم آپدیت‌ها بین workerها بر اساس کاربر
+# آپدیت‌های یک کاربر همیشه به یک worker و به همان ترتیب می‌رسند.
+async def run_front(token: str, port: int, webhook_url: str, url_path: str, base_url: str, workers: int = WEBHOOK_WORKERS):
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET is required in multi-worker webhook mode")
+    metrics_port = os.getenv('METRICS_PORT')
+    processes = []
+    for i in range(workers):
+        env = dict(os.environ, WEBHOOK_WORKER_PORT=str(WORKER_BASE_PORT + i), SHARED_DATA_VERSION='1')
+        env.pop('METRICS_PORT', None)
+        if metrics_port:
+            env['METRICS_PORT'] = str(int(metrics_port) + 1 + i)
+        processes.append(WorkerProcess(i, env))
+
+    for process in processes:
+        process.spawn()
+    watchers = [asyncio.create_task(process.watch()) for process in processes]
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        forwarders = [Forwarder(client, WORKER_BASE_PORT + i) for i in range(workers)]
+        for forwarder in forwarders:
+            forwarder.start()
+
+        async def handle(method: str, path: str, headers: dict, body: bytes) -> str:
+            if method != 'POST' or path != f'/{url_path}':
+                return '404 Not Found'
+            if headers.get('x-telegram-bot-api-secret-token') != WEBHOOK_SECRET:
+                return '403 Forbidden'
+            data = json.loads(body)
+            await forwarders[shard_key(data) % workers].queue.put(body)
+            return '200 OK'
+
+        server = await asyncio.start_server(
+            lambda reader, writer: serve_requests(reader, writer, handle), '0.0.0.0', port
+        )
+        logger.info(f"Webhook front listening on port {port} with {workers} workers")
+
+        async with Bot(token, base_url=base_url) as bot:
+            await bot.set_webhook(webhook_url, allowed_updates=Update.ALL_TYPES, secret_token=WEBHOOK_SECRET)
+
+        await _stop_event().wait()
+
+        server.close()
+        await server.wait_closed()
+        for forwarder in forwarders:
+            await forwarder.stop()
+
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        await asyncio.get_running_loop().run_in_executor(None, process.process.wait)
+    for watcher in watchers:
+        watcher.cancel()
+
+
+# پروسس worker: آپدیت‌ها را از پروسس جلویی (فقط از 127.0.0.1) می‌گیرد و به ترتیب در صف Application می‌گذارد
+async def run_worker(application: Application, port: int):
+    async def handle(method: str, path: str, headers: dict, body: bytes) -> str:
+        if method != 'POST' or path != WORKER_PATH:
+            return '404 Not Found'
+        for data in json.loads(body):
+            try:
+                update = Update.de_json(data, application.bot)
+            except Exception as e:
+                logger.error(f"Dropping malformed update {data.get('update_id')}: {e!r}")
+                continue
+            await application.update_queue.put(update)
+        return '200 OK'
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    # هر درخواست پروسس جلویی تا FORWARD_BATCH_SIZE آپدیت دارد
+    server = await asyncio.start_server(
+        lambda reader, writer: serve_requests(reader, writer, handle, FORWARD_BATCH_SIZE * MAX_REQUEST_BYTES),
+        '127.0.0.1', port
+    )
+    logger.info(f"Worker listening on 127.0.0.1:{port}")
+
+    await _stop_event().wait()
+
+    server.close()
+    await server.wait_closed()
+    await application.stop()
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)